@@ -0,0 +1,100 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+class AnalyticsRefresher:
+    def __init__(self, client_pool, account_lock, decay=None, min_interval=None, max_interval=None, max_age=None,
+                 budget=None):
+        """
+        Re-polls the analytics of posted reels on a decaying schedule: each post is polled again
+        after a fraction (decay) of its age, clamped to [min_interval, max_interval], and drops
+        off the schedule once it is older than max_age. Each run polls at most budget posts per
+        account, most overdue first, through that account's pooled client; requests are paced
+        by the client's rate limiter. Each poll holds account_lock(username), the lock posting
+        holds, and each post is claimed first so several workers never poll the same one.
+        """
+        if decay is None:
+            decay = float(os.getenv('ANALYTICS_REFRESH_DECAY', 0.25))
+        if min_interval is None:
+            min_interval = timedelta(minutes=float(os.getenv('ANALYTICS_REFRESH_MIN_MINUTES', 30)))
+        if max_interval is None:
+            max_interval = timedelta(hours=float(os.getenv('ANALYTICS_REFRESH_MAX_HOURS', 48)))
+        if max_age is None:
+            max_age = timedelta(days=float(os.getenv('ANALYTICS_REFRESH_MAX_DAYS', 14)))
+        if budget is None:
+            budget = int(os.getenv('ANALYTICS_REQUESTS_PER_ACCOUNT', 10))
+        self.client_pool = client_pool
+        self.account_lock = account_lock
+        self.decay = decay
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_age = max_age
+        self.budget = budget
+        self.polled = 0
+        self.failed = 0
+        self._running = set()
+
+    def next_refresh(self, post_date, now=None):
+        """
+        Returns when a post made at post_date should next be polled, or None once it is too old.
+        """
+        now = now or datetime.utcnow()
+        age = now - post_date
+        if age >= self.max_age:
+            return None
+        interval = min(max(age * self.decay, self.min_interval), self.max_interval)
+        return now + interval
+
+    async def run(self, db, accounts):
+        """
+        Polls the due posts of every configured account; accounts are polled concurrently.
+        accounts are (username, password, source_accounts, proxy) tuples.
+        """
+        tasks = [self.refresh_account(db, account) for account in accounts if account[0] not in self._running]
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def refresh_account(self, db, account):
+        """
+        Claims and polls up to budget due posts of one account, one at a time, so a post
+        waiting for the account isn't held up by the whole batch.
+        Posts beyond the budget stay due and are picked up by a later run.
+        """
+        username, password, _, proxy = account
+        self._running.add(username)
+        refreshed = 0
+        try:
+            for _ in range(self.budget):
+                post = await asyncio.to_thread(db.claim_analytics_due, username, datetime.utcnow(), self.min_interval)
+                if not post:
+                    break
+                analytics = None
+                healthy = False
+                async with self.account_lock(username):
+                    insta = await self.client_pool.get(username, password, proxy)
+                    if insta is not None:
+                        try:
+                            analytics = await insta.get_reel_analytics(post["media_id"])
+                            healthy = insta.healthy
+                        finally:
+                            self.client_pool.release(insta)
+                if not analytics and not healthy:
+                    # No usable session; hand the claim back so the post is polled once it is repaired
+                    await asyncio.to_thread(db.schedule_analytics_refresh, username, post["shortcode"], post["next_analytics_at"])
+                    break
+                if analytics:
+                    self.polled += 1
+                    await asyncio.to_thread(db.update_post_analytics, post["shortcode"], analytics, username)
+                else:
+                    # Reschedule anyway, so a deleted post doesn't take the whole budget every run
+                    self.failed += 1
+                next_at = self.next_refresh(post["post_date"])
+                await asyncio.to_thread(db.schedule_analytics_refresh, username, post["shortcode"], next_at)
+                refreshed += 1
+            if refreshed:
+                logging.info(f"Refreshed analytics of {refreshed} posts for {username}.")
+        except Exception as e:
+            logging.error(f"Analytics refresh failed for {username}: {e}")
+        finally:
+            self._running.discard(username)
@@ -1,11 +1,17 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from database import Database
+from database import get_database
+from event_stream import EventBroadcaster
+import metrics
 import os
+import hmac
+import time
+import zlib
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-from datetime import datetime
-import openai
-from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from bson.errors import InvalidId
 
 load_dotenv()
 
@@ -16,10 +22,8 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-mongo_conn_str = os.getenv('MONGO_CONNECTION_STRING')
-mongo_db_name = os.getenv('MONGO_DATABASE_NAME')
-openai.api_key = os.getenv('OPENAI_API_KEY')
-db = Database(mongo_conn_str, mongo_db_name)
+# Live logs and post/queue changes for connected dashboards, fed once the database is connected
+events = EventBroadcaster()
 
 class User(UserMixin):
     def __init__(self, user_doc):
@@ -27,19 +31,142 @@ class User(UserMixin):
         self.username = user_doc['username']
         self.role = user_doc['role']
 
+class UserCache:
+    def __init__(self, max_size=None, ttl=None):
+        """
+        Bounded cache of loaded User objects by id, so authenticated requests don't each look
+        the user up. Entries expire after ttl seconds (which bounds how long a change made by
+        another process goes unnoticed); changes made in this process invalidate them at once.
+        The least recently used entry is dropped when full.
+        """
+        self.max_size = max_size or int(os.getenv('DASHBOARD_USER_CACHE_SIZE', 1000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('DASHBOARD_USER_CACHE_SECONDS', 300))
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._users[user.id] = (user, time.monotonic() + self.ttl)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def on_change(self, kind, payload):
+        """
+        Database listener: drops a user who was changed or deleted.
+        """
+        if kind == "user":
+            self.invalidate(payload.get("user_id"))
+
+user_cache = UserCache()
+
+_db = None
+_db_lock = threading.Lock()
+
+def get_db():
+    """
+    Returns the dashboard's database handle, connecting on first use rather than at import,
+    so importing the app (as main.py does) costs nothing until a request comes in.
+    """
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+                events.attach(db)
+                db.add_listener(user_cache.on_change)
+                _db = db
+    return _db
+
+_openai = None
+
+def get_openai():
+    """
+    Returns the openai module, imported and configured on first use.
+    """
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        _openai = openai
+    return _openai
+
+def parse_scheduled_time(value):
+    """
+    Parses an ISO 8601 time into a naive UTC datetime, as stored in the queue. Returns None if invalid.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def validated_json(kind, username, build):
+    """
+    Responds with build()'s JSON, tagged with an ETag derived from the account's change counter
+    for kind and the query string. A request whose If-None-Match still matches gets an empty
+    304 without build() running.
+    """
+    version = get_db().get_change_counter(username, kind)
+    etag = f"{kind}-{username}-{version}-{zlib.crc32(request.query_string):x}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Let clients keep the body but always check back with the validator
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def page_args():
+    """
+    Reads the cursor and limit query arguments of a paginated endpoint.
+    """
+    return request.args.get('cursor') or None, request.args.get('limit', 50, type=int)
+
 @login_manager.user_loader
 def load_user(user_id):
-    user_doc = db.db.users.find_one({"_id": ObjectId(user_id)})
-    return User(user_doc) if user_doc else None
+    user = user_cache.get(user_id)
+    if user is None:
+        try:
+            user_doc = get_db().get_user(user_id)
+        except InvalidId:
+            return None
+        if not user_doc:
+            return None
+        user = User(user_doc)
+        user_cache.put(user)
+    return user
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user_doc = db.authenticate_user(username, password)
+        user_doc = get_db().authenticate_user(username, password)
         if user_doc:
             user = User(user_doc)
+            user_cache.put(user)
             login_user(user)
             return redirect(url_for('dashboard'))
         flash('Invalid credentials')
@@ -72,10 +199,30 @@ def get_accounts():
 @app.route('/api/reels/<username>')
 @login_required
 def get_reels(username):
+    """
+    Pages through posted (type=posted) or available (type=available) reels, newest first.
+    Without a type, returns the first page and total of each.
+    """
+    kind = request.args.get('type')
+    cursor, limit = page_args()
+    if kind not in (None, 'posted', 'available'):
+        return jsonify({'error': 'type must be posted or available'}), 400
+
+    def build():
+        pages = {}
+        if kind in (None, 'posted'):
+            items, next_cursor = get_db().get_posts_page(username, cursor, limit)
+            pages['posted'] = {'items': items, 'next_cursor': next_cursor, 'total': get_db().count_posts(username)}
+        if kind in (None, 'available'):
+            items, next_cursor = get_db().get_available_page(username, cursor, limit)
+            pages['available'] = {'items': items, 'next_cursor': next_cursor,
+                                  'total': get_db().count_available_not_posted(username)}
+        return pages
+
     try:
-        posted = db.get_posts(username)
-        available = db.get_available_not_posted(username)
-        return jsonify({'posted': posted, 'available': available})
+        return validated_json('reels', username, build)
+    except InvalidId:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -83,45 +230,124 @@ def get_reels(username):
 @login_required
 def get_analytics(username):
     try:
-        posts = db.get_posts(username)
-        total_views = sum(p.get('analytics', {}).get('views', 0) for p in posts)
-        total_likes = sum(p.get('analytics', {}).get('likes', 0) for p in posts)
-        total_shares = sum(p.get('analytics', {}).get('shares', 0) for p in posts)
-        engagement_rate = (total_likes + total_shares) / max(total_views, 1) * 100 if total_views > 0 else 0
+        totals = get_db().get_analytics_totals(username)
+        total_views = totals['views']
+        engagement_rate = (totals['likes'] + totals['shares']) / max(total_views, 1) * 100 if total_views > 0 else 0
         return jsonify({
-            'total_posts': len(posts),
+            'total_posts': totals['posts'],
             'total_views': total_views,
-            'total_likes': total_likes,
-            'total_shares': total_shares,
+            'total_likes': totals['likes'],
+            'total_shares': totals['shares'],
+            'total_comments': totals['comments'],
             'engagement_rate': round(engagement_rate, 2)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/<username>/daily')
+@login_required
+def get_daily_analytics(username):
+    try:
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        rollups = get_db().get_daily_analytics(username, today - timedelta(days=days - 1))
+        for rollup in rollups:
+            rollup['day'] = rollup['day'].strftime('%Y-%m-%d')
+        return jsonify(rollups)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/<username>/<shortcode>/history')
+@login_required
+def get_analytics_history(username, shortcode):
+    try:
+        history = get_db().get_analytics_history(username, shortcode)
+        for reading in history:
+            reading['timestamp'] = reading['timestamp'].isoformat()
+        return jsonify(history)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/logs/<username>')
 @login_required
 def get_logs(username):
+    """
+    Pages through an account's activity logs, newest first.
+    """
+    cursor, limit = page_args()
+
+    def build():
+        items, next_cursor = get_db().get_logs_page(username, cursor, limit)
+        return {'items': items, 'next_cursor': next_cursor}
+
     try:
-        logs = db.get_logs(username, limit=50)
-        return jsonify(logs)
+        return validated_json('logs', username, build)
+    except InvalidId:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint. The metrics name accounts and proxies, so they are only served
+    to logged-in users or to scrapers sending "Authorization: Bearer <METRICS_TOKEN>", unless
+    METRICS_PUBLIC opts in to open access.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    authorized = (
+        os.getenv('METRICS_PUBLIC', 'false').lower() == 'true'
+        or current_user.is_authenticated
+        or (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+    )
+    if not authorized:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/cycles')
+@login_required
+def get_cycle_metrics():
+    try:
+        cycles = get_db().get_cycle_metrics(limit=min(request.args.get('limit', 50, type=int), 500))
+        for cycle in cycles:
+            cycle['timestamp'] = cycle['timestamp'].isoformat()
+        return jsonify(cycles)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events')
+@login_required
+def stream_events():
+    """
+    Server-sent events: "log", "post" and "queue" changes as they happen. Reconnecting clients
+    resume after their Last-Event-ID; a "reset" event means the client should reload its data.
+    """
+    # Connecting attaches the event stream to the database
+    get_db()
+    client = events.subscribe(request.headers.get('Last-Event-ID'))
+    if client is None:
+        return jsonify({'error': 'Too many live connections'}), 503
+    response = Response(stream_with_context(events.stream(client)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/queue/<username>', methods=['GET', 'POST'])
 @login_required
 def manage_queue(username):
     if request.method == 'GET':
         try:
-            queue = db.get_queue(username)
+            queue = get_db().get_queue(username)
             return jsonify(queue)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     elif request.method == 'POST':
         data = request.json
         shortcode = data.get('shortcode')
-        scheduled_time = data.get('scheduled_time')
+        scheduled_time = parse_scheduled_time(data.get('scheduled_time'))
         if shortcode and scheduled_time:
-            db.add_to_queue(username, shortcode, scheduled_time)
+            get_db().add_to_queue(username, shortcode, scheduled_time)
             return jsonify({'message': 'Added to queue'}), 201
         return jsonify({'error': 'Invalid data'}), 400
 
@@ -132,25 +358,25 @@ def update_queue(username, shortcode):
         data = request.json
         status = data.get('status')
         if status:
-            db.update_queue_status(shortcode, status)
+            get_db().update_queue_status(username, shortcode, status)
             return jsonify({'message': 'Queue updated'})
         return jsonify({'error': 'Invalid status'}), 400
     elif request.method == 'DELETE':
-        db.update_queue_status(shortcode, 'cancelled')
+        get_db().update_queue_status(username, shortcode, 'cancelled')
         return jsonify({'message': 'Queue item cancelled'})
 
 @app.route('/api/alerts', methods=['GET', 'POST'])
 @login_required
 def manage_alerts():
     if request.method == 'GET':
-        alerts = db.get_alerts(current_user.id)
+        alerts = get_db().get_alerts(current_user.id)
         return jsonify(alerts)
     elif request.method == 'POST':
         data = request.json
         condition = data.get('condition')
         message = data.get('message')
         if condition and message:
-            db.create_alert(current_user.id, condition, message)
+            get_db().create_alert(current_user.id, condition, message)
             return jsonify({'message': 'Alert created'}), 201
         return jsonify({'error': 'Invalid data'}), 400
 
@@ -160,7 +386,7 @@ def ai_suggest():
     data = request.json
     prompt = data.get('prompt', 'Suggest a caption for an Instagram reel')
     try:
-        response = openai.Completion.create(
+        response = get_openai().Completion.create(
             engine="text-davinci-003",
             prompt=prompt,
             max_tokens=100
@@ -0,0 +1,75 @@
+import os
+import time
+import random
+import threading
+
+# Default simulated latency per call kind, in milliseconds
+DEFAULT_LATENCY_MS = {
+    "scrape": 150,     # one instaloader GraphQL query (profile, page of posts, single post)
+    "download": 300,   # fetching a reel and its thumbnail from the CDN
+    "read": 200,       # instagrapi account_info / media_info
+    "upload": 1500,    # instagrapi video_upload
+    "login": 800       # instagrapi login
+}
+
+class FakeConfig:
+    def __init__(self):
+        """
+        Behaviour shared by the fake instaloader and instagrapi modules, read from the
+        environment the benchmark runner sets: FAKE_<KIND>_MS latencies scaled by
+        FAKE_LATENCY_SCALE, FAKE_FAILURE_RATE and FAKE_THROTTLE_RATE (0-1, per call),
+        FAKE_POSTS_PER_SOURCE, FAKE_MEDIA_KB and FAKE_SEED.
+        """
+        scale = float(os.getenv('FAKE_LATENCY_SCALE', 1.0))
+        self.latency = {
+            kind: float(os.getenv(f'FAKE_{kind.upper()}_MS', default)) / 1000 * scale
+            for kind, default in DEFAULT_LATENCY_MS.items()
+        }
+        self.failure_rate = float(os.getenv('FAKE_FAILURE_RATE', 0))
+        self.throttle_rate = float(os.getenv('FAKE_THROTTLE_RATE', 0))
+        self.posts_per_source = int(os.getenv('FAKE_POSTS_PER_SOURCE', 24))
+        self.media_bytes = int(float(os.getenv('FAKE_MEDIA_KB', 256)) * 1024)
+        self.calls = {}
+        self.failures = 0
+        self.throttles = 0
+        self._random = random.Random(int(os.getenv('FAKE_SEED', 1)))
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random()
+
+    def sleep(self, kind):
+        """
+        Simulates one call's latency (with +-20% jitter) and counts the call.
+        """
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            jitter = self._random.uniform(0.8, 1.2)
+        time.sleep(self.latency[kind] * jitter)
+
+    def throttled(self):
+        """
+        Returns True if this call should get a 429 / "please wait" response.
+        """
+        if self.throttle_rate and self._roll() < self.throttle_rate:
+            with self._lock:
+                self.throttles += 1
+            return True
+        return False
+
+    def failed(self):
+        """
+        Returns True if this call should fail with a generic error.
+        """
+        if self.failure_rate and self._roll() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "failures": self.failures, "throttles": self.throttles}
+
+config = FakeConfig()
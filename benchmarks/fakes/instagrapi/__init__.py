@@ -0,0 +1,82 @@
+import os
+import json
+import zlib
+import itertools
+import threading
+from datetime import datetime, timezone
+from fake_config import config
+from instagrapi.types import Media
+from instagrapi.exceptions import ClientConnectionError, PleaseWaitFewMinutes
+
+# Stand-in for the instagrapi Client calls the pipeline makes
+
+_media_ids = itertools.count(1)
+_media_lock = threading.Lock()
+
+# Uploaded media per account, newest last
+_uploads = {}
+
+def _call(kind):
+    if config.throttled():
+        config.sleep(kind)
+        raise PleaseWaitFewMinutes("Please wait a few minutes before you try again.")
+    config.sleep(kind)
+    if config.failed():
+        raise ClientConnectionError(f"Simulated {kind} failure")
+
+class Client:
+    def __init__(self, settings=None, proxy=None, **kwargs):
+        self.settings = settings or {}
+        self.proxy = proxy
+        self.username = None
+
+    def set_proxy(self, dsn):
+        self.proxy = dsn
+
+    def load_settings(self, path):
+        with open(path) as f:
+            self.settings = json.load(f)
+        self.username = self.settings.get("username")
+        return self.settings
+
+    def dump_settings(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.settings, f)
+        return True
+
+    def login(self, username, password, **kwargs):
+        _call("login")
+        self.username = username
+        self.settings = {"username": username, "uuid": f"{zlib.crc32(username.encode()):08x}"}
+        return True
+
+    @property
+    def user_id(self):
+        return str(zlib.crc32((self.username or "").encode()))
+
+    def account_info(self):
+        _call("read")
+        return {"username": self.username}
+
+    def video_upload(self, path, caption="", thumbnail=None, **kwargs):
+        os.path.getsize(path)
+        _call("upload")
+        with _media_lock:
+            pk = next(_media_ids)
+        media = Media(pk=pk, id=f"{pk}_{self.user_id}", code=f"fake{pk}", caption_text=caption,
+                      taken_at=datetime.now(timezone.utc))
+        with _media_lock:
+            _uploads.setdefault(self.username, []).append(media)
+        return media
+
+    def user_medias(self, user_id, amount=20):
+        _call("read")
+        with _media_lock:
+            medias = [media for media in _uploads.get(self.username, []) if media.id.endswith(f"_{user_id}")]
+        return medias[::-1][:amount]
+
+    def media_info(self, media_pk):
+        _call("read")
+        pk = int(str(media_pk).split('_')[0])
+        return Media(pk=pk, id=str(media_pk), view_count=pk * 100, like_count=pk * 10,
+                     comment_count=pk, share_count=pk // 2)
@@ -0,0 +1,56 @@
+class ClientError(Exception):
+    pass
+
+class LoginRequired(ClientError):
+    pass
+
+class ChallengeRequired(ClientError):
+    pass
+
+class BadPassword(ClientError):
+    pass
+
+class ReloginAttemptExceeded(ClientError):
+    pass
+
+class TwoFactorRequired(ClientError):
+    pass
+
+class PleaseWaitFewMinutes(ClientError):
+    pass
+
+class RateLimitError(ClientError):
+    pass
+
+class ClientThrottledError(ClientError):
+    pass
+
+class FeedbackRequired(ClientError):
+    pass
+
+class ClientConnectionError(ClientError):
+    pass
+
+class ClientRequestTimeout(ClientError):
+    pass
+
+class ClientIncompleteReadError(ClientError):
+    pass
+
+class ClientJSONDecodeError(ClientError):
+    pass
+
+class ClientBadRequestError(ClientError):
+    pass
+
+class ClientForbiddenError(ClientError):
+    pass
+
+class ClientNotFoundError(ClientError):
+    pass
+
+class MediaNotFound(ClientNotFoundError):
+    pass
+
+class UserNotFound(ClientNotFoundError):
+    pass
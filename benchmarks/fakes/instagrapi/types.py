@@ -0,0 +1,3 @@
+class Media:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
@@ -0,0 +1,163 @@
+import os
+import time
+import zlib
+from datetime import datetime
+from fake_config import config
+
+# Stand-in for the parts of instaloader the pipeline uses. Sources are synthetic: every
+# profile has FAKE_POSTS_PER_SOURCE posts, newest first, three hours apart, with shortcodes
+# "<source>-<index>" so a post can be rebuilt from its shortcode alone.
+
+class InstaloaderException(Exception):
+    pass
+
+class ConnectionException(InstaloaderException):
+    pass
+
+class ProfileNotExistsException(InstaloaderException):
+    pass
+
+class PrivateProfileNotFollowedException(InstaloaderException):
+    pass
+
+class LoginRequiredException(InstaloaderException):
+    pass
+
+class QueryReturnedNotFoundException(ConnectionException):
+    pass
+
+class TooManyRequestsException(ConnectionException):
+    pass
+
+class RateController:
+    def __init__(self, context):
+        self._context = context
+
+    def sleep(self, secs):
+        time.sleep(secs)
+
+    def wait_before_query(self, query_type):
+        pass
+
+    def handle_429(self, query_type):
+        self.sleep(1)
+
+class InstaloaderContext:
+    def __init__(self, rate_controller=None):
+        self._rate_controller = rate_controller(self) if rate_controller is not None else RateController(self)
+
+    def query(self, query_type):
+        """
+        One simulated GraphQL round trip, paced by the rate controller; 429s are handed to
+        handle_429 and retried, as instaloader does.
+        """
+        self._rate_controller.wait_before_query(query_type)
+        while config.throttled():
+            self._rate_controller.handle_429(query_type)
+        config.sleep("scrape")
+        if config.failed():
+            raise ConnectionException(f"Simulated failure of {query_type} query")
+
+def _epoch():
+    # Anchor post times to the hour so a source looks the same across a run's cycles
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return (now - datetime(1970, 1, 1)).total_seconds()
+
+def make_node(source, index):
+    shortcode = f"{source}-{index}"
+    taken_at = int(_epoch() - index * 3 * 3600)
+    expires = int(time.time()) + 24 * 3600
+    return {
+        "shortcode": shortcode,
+        "owner": {"id": str(zlib.crc32(source.encode())), "username": source},
+        "caption": f"Synthetic reel {index} from @{source}",
+        "taken_at_timestamp": taken_at,
+        "is_video": index % 4 != 3,
+        "video_url": f"https://cdn.invalid/{shortcode}.mp4?oe={expires:x}",
+        "display_url": f"https://cdn.invalid/{shortcode}.jpg?oe={expires:x}",
+        "dimensions": {"width": 1080, "height": 1920},
+        "video_duration": 15.0
+    }
+
+class Post:
+    def __init__(self, context, node, owner_profile=None):
+        self._context = context
+        self._node = node
+
+    @classmethod
+    def from_shortcode(cls, context, shortcode):
+        context.query("post")
+        source, _, index = shortcode.rpartition('-')
+        if not source or not index.isdigit():
+            raise InstaloaderException(f"Unknown shortcode {shortcode}")
+        return cls(context, make_node(source, int(index)))
+
+    @property
+    def shortcode(self):
+        return self._node["shortcode"]
+
+    @property
+    def owner_username(self):
+        return self._node["owner"]["username"]
+
+    @property
+    def owner_id(self):
+        return self._node["owner"]["id"]
+
+    @property
+    def caption(self):
+        return self._node.get("caption")
+
+    @property
+    def date_utc(self):
+        return datetime.utcfromtimestamp(self._node["taken_at_timestamp"])
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self._node["taken_at_timestamp"])
+
+    @property
+    def is_video(self):
+        return self._node.get("is_video", False)
+
+    @property
+    def is_pinned(self):
+        return self._node.get("is_pinned", False)
+
+class Profile:
+    def __init__(self, context, username):
+        self._context = context
+        self.username = username
+
+    @classmethod
+    def from_username(cls, context, username):
+        context.query("profile")
+        if username.startswith("missing"):
+            raise ProfileNotExistsException(f"Profile {username} does not exist.")
+        return cls(context, username)
+
+    def get_posts(self):
+        for index in range(config.posts_per_source):
+            if index % 12 == 0 and index:
+                # Next page of the profile's timeline
+                self._context.query("posts_page")
+            yield Post(self._context, make_node(self.username, index))
+
+class Instaloader:
+    def __init__(self, user_agent=None, rate_controller=None, **kwargs):
+        self.context = InstaloaderContext(rate_controller)
+
+    def download_post(self, post, target):
+        config.sleep("download")
+        if config.failed():
+            raise ConnectionException(f"Simulated download failure of {post.shortcode}")
+        os.makedirs(target, exist_ok=True)
+        name = f"{post.date_utc:%Y-%m-%d_%H-%M-%S}_UTC"
+        # Content depends on the shortcode, so the media cache sees distinct files
+        seed = post.shortcode.encode()
+        video = (seed * (config.media_bytes // len(seed) + 1))[:config.media_bytes]
+        with open(os.path.join(target, f"{name}.mp4"), 'wb') as f:
+            f.write(video)
+        with open(os.path.join(target, f"{name}.jpg"), 'wb') as f:
+            f.write(seed * 64)
+        return True
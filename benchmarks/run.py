@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+# Offline benchmark of the posting pipeline. Instagram is replaced by the fake instaloader and
+# instagrapi modules in benchmarks/fakes (configurable latency, failures and 429s), and MongoDB
+# by mongomock unless --mongo-uri points at a scratch server. Usage:
+#   python benchmarks/run.py [--scenario cycle|process_account] [--accounts N] [--sources M] ...
+# Each scenario runs in a fresh process; results are compared with benchmarks/baselines/<name>.json
+# (written by --save-baseline) and a regression beyond --tolerance exits with status 1.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'fakes')
+BASELINE_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'baselines')
+
+# Compared metrics and whether a higher value is better
+COMPARED_METRICS = {
+    "wall_seconds": False,
+    "posts_per_hour": True,
+    "mongo_round_trips_per_post": False,
+    "peak_rss_mb": False
+}
+
+# Mongomock collection methods that would each be one round trip to a real server
+MONGO_METHODS = (
+    "find", "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one",
+    "delete_many", "bulk_write", "aggregate", "count_documents", "estimated_document_count",
+    "distinct", "create_index"
+)
+
+def write_config(path, options):
+    """
+    Writes a config.ini for a synthetic fleet: each account subscribes to sources_per_account
+    of the sources, round robin, and accounts are spread over the proxies.
+    """
+    per_account = min(options["sources_per_account"], options["sources"])
+    with open(path, 'w') as f:
+        for i in range(options["accounts"]):
+            sources = [f"source{(i * per_account + k) % options['sources']}" for k in range(per_account)]
+            proxy = f"http://proxy{i % options['proxies']}.invalid:8080" if options["proxies"] else ""
+            f.write(f"[Instagram_{i}]\nusername = bench{i}\npassword = secret\n"
+                    f"source_accounts = {', '.join(sources)}\nproxy = {proxy}\n\n")
+
+def scenario_env(options, workdir):
+    """
+    Environment for a scenario process: every account is due on every cycle, work happens in
+    the scratch directory, and unless --real-rate-limits is set the token buckets are opened
+    up so the fakes' latency is what gets measured.
+    """
+    env = {
+        "MONGO_CONNECTION_STRING": options["mongo_uri"] or "mongodb://benchmark",
+        "MONGO_DATABASE_NAME": f"benchmark_{os.getpid()}",
+        "MAX_CONCURRENT_ACCOUNTS": str(options["concurrency"]),
+        "MAX_CONCURRENT_PER_PROXY": str(options["per_proxy"]),
+        "SOURCE_FETCH_WORKERS": str(options["fetch_workers"]),
+        "POST_INTERVAL_HOURS": "0",
+        "POST_JITTER_MINUTES": "0",
+        "MEDIA_CACHE_DIR": os.path.join(workdir, "media_cache"),
+        "LOG_ARCHIVE_DIR": "",
+        "SSE_SOURCE": "local",
+        "FAKE_LATENCY_SCALE": str(options["latency_scale"]),
+        "FAKE_FAILURE_RATE": str(options["failure_rate"]),
+        "FAKE_THROTTLE_RATE": str(options["throttle_rate"]),
+        "FAKE_POSTS_PER_SOURCE": str(options["posts_per_source"]),
+        "FAKE_SEED": str(options["seed"])
+    }
+    if not options["real_rate_limits"]:
+        for endpoint in ("scrape", "download", "read", "upload", "login"):
+            env[f"RATE_LIMIT_{endpoint.upper()}_PER_MINUTE"] = "100000"
+            env[f"RATE_LIMIT_{endpoint.upper()}_BURST"] = "1000"
+        env["RATE_LIMIT_ACCOUNT_PER_MINUTE"] = "100000"
+        env["RATE_LIMIT_ACCOUNT_BURST"] = "1000"
+        env["RATE_LIMIT_PENALTY_SECONDS"] = "0.5"
+    return env
+
+def count_mongomock_round_trips():
+    """
+    Swaps database.py's MongoClient for mongomock and counts collection calls.
+    Returns a function giving the count so far.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("mongomock is not installed: pip install -r benchmarks/requirements.txt, or pass --mongo-uri")
+    import database
+    calls = [0]
+
+    def counted(method):
+        def wrapper(*args, **kwargs):
+            calls[0] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name in MONGO_METHODS:
+        method = getattr(mongomock.Collection, name, None)
+        if method is not None:
+            setattr(mongomock.Collection, name, counted(method))
+    database.MongoClient = lambda connection_string, **kwargs: mongomock.MongoClient(connection_string)
+    return lambda: calls[0]
+
+def count_server_round_trips():
+    """
+    Counts the commands the real server saw, from the pymongo command listener's histogram.
+    """
+    import metrics
+    return lambda: sum(count for count, _ in metrics.MONGO_SECONDS.totals("command").values())
+
+async def run_cycles(main, options):
+    """
+    Runs check_and_post --cycles times. Returns per-cycle wall times.
+    """
+    walls = []
+    for _ in range(options["cycles"]):
+        start = time.monotonic()
+        await main.check_and_post()
+        walls.append(time.monotonic() - start)
+    return walls
+
+async def run_process_account(main, options):
+    """
+    Fetches the sources once (untimed), then times process_account for every account at once,
+    under the same concurrency caps scheduled posts use. Returns per-cycle wall times.
+    """
+    db = main.get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    accounts = main.load_accounts()
+    await main.fetch_sources(db, accounts, accounts, int(os.getenv('MAX_POSTS_PER_ACCOUNT', 10)),
+                             int(os.getenv('DAYS_CUTOFF', 7)))
+
+    async def post(account):
+        username, password, _, proxy = account
+        account_lock, limits, proxy_limit = main.account_slot(username, proxy)
+        async with account_lock, limits, proxy_limit:
+            return await main.process_account(username, password, proxy, os.getenv('MONGO_CONNECTION_STRING'),
+                                              os.getenv('MONGO_DATABASE_NAME'))
+
+    walls = []
+    for _ in range(options["cycles"]):
+        start = time.monotonic()
+        await asyncio.gather(*(post(account) for account in accounts))
+        walls.append(time.monotonic() - start)
+    return walls
+
+SCENARIOS = {
+    "cycle": run_cycles,
+    "process_account": run_process_account
+}
+
+def run_scenario(scenario, options, results):
+    """
+    Runs one scenario in this (fresh) process and puts its measurements on the results queue.
+    The fakes go first on sys.path so main's imports of instaloader and instagrapi resolve to them.
+    """
+    workdir = tempfile.mkdtemp(prefix='insta-bench-')
+    try:
+        os.chdir(workdir)
+        write_config(os.path.join(workdir, 'config.ini'), options)
+        os.environ.update(scenario_env(options, workdir))
+        sys.path[:0] = [FAKES_DIR, REPO_ROOT]
+        logging.basicConfig(level=logging.WARNING if not options["verbose"] else logging.INFO)
+
+        round_trips = count_server_round_trips() if options["mongo_uri"] else count_mongomock_round_trips()
+        import main
+        import fake_config
+        from database import get_database, close_clients
+
+        trips_before = round_trips()
+        walls = asyncio.run(SCENARIOS[scenario](main, options))
+        trips = round_trips() - trips_before
+
+        db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+        posts = db.db.posts.count_documents({})
+        if options["mongo_uri"]:
+            db.client.drop_database(os.getenv('MONGO_DATABASE_NAME'))
+        close_clients()
+
+        wall = sum(walls)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results.put({
+            "scenario": scenario,
+            "wall_seconds": round(wall, 3),
+            "cycle_seconds": [round(w, 3) for w in walls],
+            "posts": posts,
+            "posts_per_hour": round(posts / wall * 3600, 1) if wall else 0.0,
+            "mongo_round_trips": trips,
+            "mongo_round_trips_per_post": round(trips / posts, 1) if posts else None,
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            "peak_rss_mb": round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+            "stages": {stage: {"count": count, "seconds": round(seconds, 3)}
+                       for stage, (count, seconds) in main.metrics.stage_totals().items()},
+            "fakes": fake_config.config.stats()
+        })
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def measure(scenario, options):
+    """
+    Runs a scenario in a spawned process and returns its measurements. Fails as soon as the
+    process dies without reporting (its traceback is on stderr) or when --timeout runs out.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_scenario, args=(scenario, options, results))
+    process.start()
+    deadline = time.monotonic() + options["timeout"]
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise SystemExit(f"Scenario {scenario} failed (exit code {process.exitcode})")
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise SystemExit(f"Scenario {scenario} did not finish within {options['timeout']:.0f}s")
+    process.join()
+    return result
+
+def compare(result, baseline, tolerance):
+    """
+    Compares a result with its baseline. Returns a list of (metric, baseline, current, regressed).
+    """
+    rows = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(metric), result.get(metric)
+        if old is None or new is None:
+            continue
+        if higher_is_better:
+            regressed = new < old * (1 - tolerance)
+        else:
+            regressed = new > old * (1 + tolerance)
+        rows.append((metric, old, new, regressed))
+    return rows
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the posting pipeline against fake Instagram clients.")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help="scenario to run; repeatable (default: all)")
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--sources-per-account', type=int, default=3)
+    parser.add_argument('--posts-per-source', type=int, default=24)
+    parser.add_argument('--proxies', type=int, default=4, help="0 runs every account on the host's own IP")
+    parser.add_argument('--concurrency', type=int, default=5, help="MAX_CONCURRENT_ACCOUNTS")
+    parser.add_argument('--per-proxy', type=int, default=1, help="MAX_CONCURRENT_PER_PROXY")
+    parser.add_argument('--fetch-workers', type=int, default=4, help="SOURCE_FETCH_WORKERS")
+    parser.add_argument('--cycles', type=int, default=1)
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="multiplier on the fakes' latencies")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--real-rate-limits', action='store_true', help="keep the production token bucket limits")
+    parser.add_argument('--mongo-uri', help="scratch MongoDB server to use instead of mongomock")
+    parser.add_argument('--name', help="baseline name (default: <scenario>-<accounts>x<sources>)")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression (default: 0.2)")
+    parser.add_argument('--timeout', type=float, default=1800)
+    parser.add_argument('--verbose', action='store_true')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    options = {key: value for key, value in vars(args).items() if key not in ('scenario', 'name', 'save_baseline', 'tolerance')}
+    failed = False
+    for scenario in args.scenario or sorted(SCENARIOS):
+        name = args.name or f"{scenario}-{args.accounts}x{args.sources}"
+        if args.name and len(args.scenario or SCENARIOS) > 1:
+            name = f"{args.name}-{scenario}"
+        result = measure(scenario, options)
+        result["options"] = options
+        print(f"\n{name}: {result['posts']} posts in {result['wall_seconds']:.1f}s "
+              f"({result['posts_per_hour']:.0f}/h), {result['mongo_round_trips']} Mongo round trips "
+              f"({result['mongo_round_trips_per_post']} per post), peak RSS {result['peak_rss_mb']} MB")
+        for stage, totals in sorted(result["stages"].items()):
+            print(f"  {stage:<24} {totals['count']:>6} calls {totals['seconds']:>10.1f}s")
+        print(f"  fake calls: {result['fakes']['calls']}, failures: {result['fakes']['failures']}, "
+              f"throttles: {result['fakes']['throttles']}")
+
+        path = os.path.join(BASELINE_DIR, f"{name}.json")
+        if args.save_baseline:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+            print(f"  saved baseline {os.path.relpath(path, REPO_ROOT)}")
+        elif os.path.exists(path):
+            with open(path) as f:
+                baseline = json.load(f)
+            if baseline.get("options") != options:
+                print("  warning: baseline was recorded with different options")
+            for metric, old, new, regressed in compare(result, baseline, args.tolerance):
+                print(f"  {metric:<28} {old:>10} -> {new:>10}{'  REGRESSED' if regressed else ''}")
+                failed = failed or regressed
+        else:
+            print(f"  no baseline at {os.path.relpath(path, REPO_ROOT)}; run with --save-baseline to record one")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
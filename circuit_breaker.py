@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    def __init__(self, name, threshold, reset_timeout, max_reset_timeout):
+        """
+        Stops calls to one source account or proxy after threshold consecutive failures.
+        Once open, calls are refused for reset_timeout seconds; then a single probe call is let
+        through (half-open). A successful probe closes the circuit, a failed one reopens it with
+        the timeout doubled, up to max_reset_timeout. Thread-safe.
+        """
+        self.name = name
+        self.threshold = threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns True if a call may be made now. In the half-open state only one probe is let
+        through at a time; a probe that never reports back is replaced after reset_timeout.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                logging.info(f"Circuit for {self.name} is half-open, probing.")
+            elif self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+                return False
+            self.probe_started_at = now
+            return True
+
+    def is_open(self):
+        """
+        Returns True while calls are being refused, without using up a half-open probe.
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuit for {self.name} closed.")
+            self.state = CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self.probe_started_at = None
+
+    def record_failure(self, permanent=False):
+        """
+        Counts a failed call. A permanent failure (e.g. a source that no longer exists) opens
+        the circuit straight away.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            elif not permanent and self.failures < self.threshold:
+                return
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probe_started_at = None
+            self.trips += 1
+            logging.warning(f"Circuit for {self.name} opened after {self.failures} failures; "
+                            f"retrying in {self.reset_timeout:.0f}s.")
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips,
+                    "reset_timeout": self.reset_timeout}
+
+class CircuitBreakers:
+    def __init__(self, threshold=None, reset_timeout=None, max_reset_timeout=None):
+        """
+        Circuit breakers keyed by (kind, name), e.g. ("source", username) or ("proxy", url),
+        created on first use with the CIRCUIT_* settings.
+        """
+        self.threshold = threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+        self.reset_timeout = reset_timeout or float(os.getenv('CIRCUIT_RESET_SECONDS', 300))
+        self.max_reset_timeout = max_reset_timeout or float(os.getenv('CIRCUIT_MAX_RESET_SECONDS', 3600))
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, name):
+        with self._lock:
+            breaker = self._breakers.get((kind, name))
+            if breaker is None:
+                breaker = self._breakers[(kind, name)] = CircuitBreaker(
+                    f"{kind} {name}", self.threshold, self.reset_timeout, self.max_reset_timeout
+                )
+            return breaker
+
+    def stats(self):
+        """
+        Returns the breakers that are not closed, keyed "kind:name".
+        """
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {f"{kind}:{name}": breaker.stats() for (kind, name), breaker in breakers.items()
+                if breaker.state != CLOSED}
+
+_breakers = None
+_breakers_lock = threading.Lock()
+
+def get_circuit_breakers():
+    """
+    Returns the process-wide circuit breakers, shared by every client and source fetcher.
+    """
+    global _breakers
+    with _breakers_lock:
+        if _breakers is None:
+            _breakers = CircuitBreakers()
+        return _breakers
@@ -0,0 +1,112 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from instagram import Instagram
+
+class InstagramClientPool:
+    def __init__(self, session_ttl=None, relogin_backoff=None):
+        """
+        Keeps one long-lived Instagram client per account across scheduler cycles.
+        Sessions are revalidated lazily once session_ttl has passed, and clients whose
+        session was rejected are re-logged in by a background task. A client is checked out
+        to one user at a time (posting, prefetching, analytics or a re-login), as neither
+        instagrapi nor instaloader clients are safe to share between threads.
+        """
+        if session_ttl is None:
+            session_ttl = timedelta(hours=float(os.getenv('SESSION_REVALIDATE_HOURS', 6)))
+        if relogin_backoff is None:
+            relogin_backoff = timedelta(minutes=float(os.getenv('SESSION_RELOGIN_BACKOFF_MINUTES', 15)))
+        self.session_ttl = session_ttl
+        self.relogin_backoff = relogin_backoff
+        self._clients = {}
+        self._locks = {}
+        self._relogins = {}
+        self._next_relogin = {}
+
+    async def get(self, username, password, proxy=None):
+        """
+        Returns a ready client for the account, or None while its session is being repaired
+        in the background. The first use of an account may log in inline.
+        The client is checked out exclusively: other users of the account wait until it is
+        handed back with release, which every caller given a client must do.
+        """
+        lock = self._locks.setdefault(username, asyncio.Lock())
+        await lock.acquire()
+        insta = None
+        try:
+            insta = self._clients.get(username)
+            if insta is not None and (insta.password != password or insta.proxy != proxy):
+                # Credentials or proxy changed in config.ini
+                insta = None
+            if insta is None:
+                insta = await asyncio.to_thread(Instagram, username, password, proxy, False)
+                self._clients[username] = insta
+                if not insta.healthy:
+                    # No usable saved session yet, so there is nothing to fall back on
+                    await asyncio.to_thread(insta.login)
+            if not insta.healthy:
+                self.release(insta)
+                return None
+            if insta.needs_validation(self.session_ttl):
+                try:
+                    await asyncio.to_thread(insta.ensure_session, self.session_ttl)
+                except Exception:
+                    self.release(insta)
+                    return None
+            return insta
+        except BaseException:
+            if insta is not None:
+                self.release(insta)
+            elif lock.locked():
+                lock.release()
+            raise
+
+    def release(self, insta):
+        """
+        Hands a checked out client back, scheduling a background re-login if its session broke.
+        """
+        lock = self._locks.get(insta.username)
+        if lock is not None and lock.locked():
+            lock.release()
+        if insta.healthy or insta.username in self._relogins:
+            return
+        if datetime.utcnow() < self._next_relogin.get(insta.username, datetime.min):
+            return
+        task = asyncio.get_running_loop().create_task(self._relogin(insta))
+        self._relogins[insta.username] = task
+
+    async def _relogin(self, insta):
+        try:
+            # Waits for the client to be free, and keeps it until the login is done
+            async with self._locks.setdefault(insta.username, asyncio.Lock()):
+                await asyncio.to_thread(insta.login)
+        except Exception as e:
+            # Back off before trying again so a locked account isn't hammered
+            self._next_relogin[insta.username] = datetime.utcnow() + self.relogin_backoff * min(insta.failures, 8)
+            logging.error(f"Background re-login failed for {insta.username}: {e}")
+        finally:
+            self._relogins.pop(insta.username, None)
+
+    def health(self):
+        """
+        Returns per-account client health for monitoring.
+        """
+        return {
+            username: {
+                "healthy": insta.healthy,
+                "last_validated": insta.last_validated,
+                "failures": insta.failures,
+                "last_error": insta.last_error,
+                "relogin_pending": username in self._relogins
+            }
+            for username, insta in self._clients.items()
+        }
+
+    async def close(self):
+        """
+        Cancels pending background re-logins.
+        """
+        for task in list(self._relogins.values()):
+            task.cancel()
+        self._relogins.clear()
@@ -1,23 +1,344 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, CollectionInvalid, OperationFailure
+import os
+import atexit
 import logging
-from datetime import datetime, timezone
+import threading
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
 from werkzeug.security import generate_password_hash, check_password_hash
+from log_buffer import ActivityLogBuffer
+from metrics import MongoCommandTimer
+
+# Post analytics counters summed into the totals and daily rollups
+ANALYTICS_METRICS = ("views", "likes", "comments", "shares")
+
+# Largest page the paginated getters return
+MAX_PAGE_SIZE = 200
+
+# Stages of a post job, in order; a job is finished once it reaches the last one
+JOB_STAGES = ("selected", "downloaded", "uploaded", "recorded", "analytics")
+
+def log_retention():
+    """
+    Reads how long logs are kept per level from LOG_RETENTION_DAYS ("INFO=30,ERROR=180"),
+    with LOG_RETENTION_DEFAULT_DAYS for levels not listed. Returns ({level: timedelta}, default).
+    """
+    default = timedelta(days=float(os.getenv('LOG_RETENTION_DEFAULT_DAYS', 30)))
+    retention = {}
+    for item in os.getenv('LOG_RETENTION_DAYS', 'DEBUG=3,INFO=30,WARNING=90,ERROR=180').split(','):
+        level, _, days = item.partition('=')
+        try:
+            retention[level.strip().upper()] = timedelta(days=float(days))
+        except ValueError:
+            logging.error(f"Ignoring invalid LOG_RETENTION_DAYS entry: {item}")
+    return retention, default
+
+# Process-wide registry of pooled clients and database handles, shared by the
+# scheduler and the Flask dashboard.
+_clients = {}
+_databases = {}
+_registry_lock = threading.Lock()
+
+def get_client(connection_string):
+    """
+    Returns the shared pooled MongoClient for a connection string, creating it on first use.
+    """
+    with _registry_lock:
+        client = _clients.get(connection_string)
+        if client is None:
+            client = MongoClient(
+                connection_string,
+                maxPoolSize=int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+                minPoolSize=int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+                maxIdleTimeMS=int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+                serverSelectionTimeoutMS=int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+                connectTimeoutMS=int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+                socketTimeoutMS=int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+                event_listeners=[MongoCommandTimer()]
+            )
+            try:
+                # Test the connection once per client rather than once per handle
+                client.server_info()
+            except Exception:
+                client.close()
+                raise
+            _clients[connection_string] = client
+            logging.info("Successfully connected to MongoDB.")
+        return client
+
+def get_database(connection_string, database_name):
+    """
+    Returns the shared Database handle for a connection string and database name.
+    """
+    key = (connection_string, database_name)
+    db = _databases.get(key)
+    if db is None:
+        db = Database(connection_string, database_name)
+        with _registry_lock:
+            created = key not in _databases
+            db = _databases.setdefault(key, db)
+        if created:
+            db.ensure_indexes()
+    return db
+
+def close_clients():
+    """
+    Closes every pooled client. Safe to call more than once.
+    """
+    with _registry_lock:
+        clients = list(_clients.values())
+        databases = list(_databases.values())
+        _clients.clear()
+        _databases.clear()
+    # Drain buffered logs while the clients are still open
+    for db in databases:
+        db.log_buffer.close()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logging.error(f"Error closing MongoDB client: {e}")
+    if clients:
+        logging.info("Closed MongoDB connections.")
+
+atexit.register(close_clients)
 
 class Database:
     def __init__(self, connection_string, database_name):
         """
-        Initializes the database connection.
+        Initializes the database handle on top of the shared client pool.
         """
         try:
-            self.client = MongoClient(connection_string)
+            self.client = get_client(connection_string)
             self.db = self.client[database_name]
-            # Test the connection
-            self.client.server_info()
-            logging.info("Successfully connected to MongoDB.")
+            self.listeners = []
+            self.log_retention, self.default_log_retention = log_retention()
+            self.recent_logs_bytes = int(float(os.getenv('LOG_RECENT_SIZE_MB', 0)) * 1024 * 1024)
+            self.log_buffer = ActivityLogBuffer(
+                self.db.logs,
+                max_size=int(os.getenv('LOG_BUFFER_SIZE', 10000)),
+                batch_size=int(os.getenv('LOG_BATCH_SIZE', 100)),
+                flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 2.0)),
+                policy=os.getenv('LOG_BUFFER_POLICY', 'drop'),
+                on_flush=self._logs_flushed
+            )
         except Exception as e:
             logging.error(f"Error connecting to MongoDB: {e}")
             raise
 
+    # Indexes
+    def ensure_indexes(self):
+        """
+        Creates the indexes the posting pipeline relies on. Safe to run on every startup.
+        """
+        unique_key = [("account_username", ASCENDING), ("shortcode", ASCENDING)]
+        try:
+            # Duplicates from before the unique indexes existed would make creating them fail
+            self._remove_duplicates(self.db.available_reels, [{"$sort": {"posted": -1, "_id": 1}}])
+            self._remove_duplicates(self.db.posts, [{"$sort": {"_id": 1}}])
+            # Keep the copy that shows a reel was posted (done) or is being posted over a
+            # pending, failed or cancelled one, so a finished item isn't posted again
+            self._remove_duplicates(self.db.queue, [
+                {"$addFields": {"_rank": {"$switch": {"branches": [
+                    {"case": {"$in": ["$status", ["done", "posted"]]}, "then": 2},
+                    {"case": {"$eq": ["$status", "in_progress"]}, "then": 1}
+                ], "default": 0}}}},
+                {"$sort": {"_rank": -1, "_id": 1}}
+            ])
+            self._backfill_posted_flags()
+            self._convert_queue_times()
+            self._backfill_daily_rollups()
+            self._backfill_log_expiry()
+        except Exception as e:
+            logging.error(f"Error migrating existing data: {e}")
+        failed = []
+        failed += self._create_index(self.db.available_reels, unique_key, unique=True, name="account_shortcode_unique")
+        self._create_index(self.db.available_reels, [("account_username", ASCENDING), ("posted", ASCENDING)], name="account_posted")
+        failed += self._create_index(self.db.posts, unique_key, unique=True, name="account_shortcode_unique")
+        self._create_index(self.db.posts, [("account_username", ASCENDING), ("post_date", ASCENDING)], name="account_post_date")
+        self._create_index(self.db.posts, [("account_username", ASCENDING), ("next_analytics_at", ASCENDING)],
+                           name="account_next_analytics_at", partialFilterExpression={"next_analytics_at": {"$exists": True}})
+        self._ensure_analytics_history()
+        self._create_index(self.db.analytics_daily, [("account_username", ASCENDING), ("day", ASCENDING)], unique=True, name="account_day_unique")
+        failed += self._create_index(self.db.queue, unique_key, unique=True, name="account_shortcode_unique")
+        self._create_index(self.db.queue, [("status", ASCENDING), ("scheduled_time", ASCENDING)], name="status_scheduled_time")
+        self._create_index(self.db.queue, [("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at")
+        self._create_index(self.db.posts, [("account_username", ASCENDING), ("_id", ASCENDING)], name="account_id")
+        self._create_index(self.db.available_reels, [("account_username", ASCENDING), ("posted", ASCENDING), ("_id", ASCENDING)], name="account_posted_id")
+        self._create_index(self.db.logs, [("account_username", ASCENDING), ("_id", ASCENDING)], name="account_id")
+        self._create_index(self.db.logs, [("account_username", ASCENDING), ("timestamp", ASCENDING)], name="account_timestamp")
+        # Each log carries its own expiry, set from its level's retention
+        self._create_index(self.db.logs, [("expire_at", ASCENDING)], expireAfterSeconds=0, name="expire_at_ttl")
+        self._create_index(self.db.cycle_metrics, [("timestamp", ASCENDING)], name="timestamp_ttl",
+                           expireAfterSeconds=int(float(os.getenv('METRICS_RETENTION_DAYS', 30)) * 86400))
+        self._create_index(self.db.log_archives, [("day", ASCENDING)], unique=True, name="day_unique")
+        self._ensure_recent_logs()
+        self._create_index(self.db.change_counters, [("account_username", ASCENDING)], unique=True, name="account_unique")
+        failed += self._create_index(self.db.account_status, [("account_username", ASCENDING)], unique=True, name="account_unique")
+        self._create_index(self.db.source_cursors, [("source_username", ASCENDING)], unique=True, name="source_unique")
+        failed += self._create_index(self.db.jobs, [("key", ASCENDING)], unique=True, name="key_unique")
+        self._create_index(self.db.jobs, [("account_username", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)],
+                           name="account_status_created_at")
+        self._create_index(self.db.jobs, [("finished_at", ASCENDING)], name="finished_at_ttl",
+                           expireAfterSeconds=int(float(os.getenv('POST_JOB_RETENTION_DAYS', 30)) * 86400))
+        if failed:
+            # These indexes are what stops a reel being stored, queued or posted twice
+            logging.critical(f"Unique indexes missing, duplicate posts are possible until they exist: {', '.join(failed)}")
+
+    def _ensure_analytics_history(self):
+        """
+        Creates analytics_history as a time-series collection where the server supports it
+        (MongoDB 5.0+); older servers get a plain collection with an equivalent index.
+        """
+        try:
+            self.db.create_collection(
+                "analytics_history",
+                timeseries={"timeField": "timestamp", "metaField": "post", "granularity": "hours"}
+            )
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            # 48: NamespaceExists
+            if e.code != 48:
+                logging.info(f"analytics_history is a regular collection: {e}")
+        except Exception as e:
+            logging.info(f"analytics_history is a regular collection: {e}")
+        self._create_index(
+            self.db.analytics_history,
+            [("post.account_username", ASCENDING), ("post.shortcode", ASCENDING), ("timestamp", ASCENDING)],
+            name="post_timestamp"
+        )
+
+    def _ensure_recent_logs(self):
+        """
+        Creates the capped logs_recent collection the dashboard's first log pages are read from,
+        if LOG_RECENT_SIZE_MB enables it.
+        """
+        if not self.recent_logs_bytes:
+            return
+        try:
+            self.db.create_collection("logs_recent", capped=True, size=self.recent_logs_bytes)
+        except CollectionInvalid:
+            pass
+        except OperationFailure as e:
+            # 48: NamespaceExists
+            if e.code != 48:
+                logging.error(f"Error creating logs_recent: {e}")
+        except Exception as e:
+            logging.error(f"Error creating logs_recent: {e}")
+        self._create_index(self.db.logs_recent, [("account_username", ASCENDING), ("_id", ASCENDING)], name="account_id")
+
+    def _create_index(self, collection, keys, **kwargs):
+        """
+        Creates one index, logging instead of raising so a bad index doesn't block startup.
+        Returns a list naming the index if it couldn't be created, else an empty list.
+        """
+        try:
+            collection.create_index(keys, **kwargs)
+            return []
+        except Exception as e:
+            logging.error(f"Error creating index {kwargs.get('name', keys)} on {collection.name}: {e}")
+            return [f"{collection.name}.{kwargs.get('name', keys)}"]
+
+    def _remove_duplicates(self, collection, order):
+        """
+        Drops duplicate (account_username, shortcode) entries of a collection left over from before
+        its unique index existed, keeping the first of each group after the order stages.
+        Skipped once the index is in place, as there can't be any duplicates then.
+        """
+        if "account_shortcode_unique" in collection.index_information():
+            return
+        duplicates = collection.aggregate(order + [
+            {"$group": {
+                "_id": {"account_username": "$account_username", "shortcode": "$shortcode"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1}
+            }},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True)
+        removed = 0
+        for group in duplicates:
+            result = collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+            removed += result.deleted_count
+        if removed:
+            logging.info(f"Removed {removed} duplicate entries from {collection.name}.")
+
+    def _backfill_posted_flags(self):
+        """
+        Sets the posted flag on available_reels entries written before the flag existed.
+        """
+        if not self.db.available_reels.find_one({"posted": {"$exists": False}}, {"_id": 1}):
+            return
+        self.db.available_reels.update_many({"posted": {"$exists": False}}, {"$set": {"posted": False}})
+        requests = [
+            UpdateOne(
+                {"account_username": doc["account_username"], "shortcode": doc["shortcode"]},
+                {"$set": {"posted": True}}
+            )
+            for doc in self.db.posts.find({}, {"_id": 0, "account_username": 1, "shortcode": 1})
+        ]
+        if requests:
+            self.db.available_reels.bulk_write(requests, ordered=False)
+        logging.info("Backfilled posted flags on available reels.")
+
+    def _convert_queue_times(self):
+        """
+        Converts queue scheduled_time strings, stored before times were parsed, into dates
+        so the executor's range queries can match them.
+        """
+        for item in self.db.queue.find({"scheduled_time": {"$type": "string"}}, {"scheduled_time": 1}):
+            try:
+                parsed = datetime.fromisoformat(item["scheduled_time"].replace('Z', '+00:00'))
+            except ValueError:
+                logging.error(f"Queue item {item['_id']} has an unreadable scheduled_time: {item['scheduled_time']}")
+                continue
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            self.db.queue.update_one({"_id": item["_id"]}, {"$set": {"scheduled_time": parsed}})
+
+    def _backfill_daily_rollups(self):
+        """
+        Builds analytics_daily from existing posts the first time it is needed. Past metric gains
+        have no history, so each post's current analytics are counted on the day it was posted.
+        """
+        if self.db.analytics_daily.find_one({}, {"_id": 1}) is not None:
+            return
+        rollups = list(self.db.posts.aggregate([
+            {"$match": {"post_date": {"$type": "date"}}},
+            {"$group": dict(
+                {"_id": {
+                    "account_username": "$account_username",
+                    "day": {"$dateFromParts": {
+                        "year": {"$year": "$post_date"},
+                        "month": {"$month": "$post_date"},
+                        "day": {"$dayOfMonth": "$post_date"}
+                    }}
+                }, "posts": {"$sum": 1}},
+                **{metric: {"$sum": {"$ifNull": [f"$analytics.{metric}", 0]}} for metric in ANALYTICS_METRICS}
+            )}
+        ]))
+        now = datetime.utcnow()
+        for rollup in rollups:
+            rollup.update(rollup.pop("_id"), updated_at=now)
+        if rollups:
+            self.db.analytics_daily.insert_many(rollups)
+            logging.info(f"Built {len(rollups)} daily analytics rollups from existing posts.")
+
+    def _backfill_log_expiry(self):
+        """
+        Gives logs written before retention existed an expire_at from their level's retention.
+        """
+        levels = self.db.logs.distinct("level", {"expire_at": {"$exists": False}})
+        for level in levels:
+            retention = self.log_retention.get(str(level).upper(), self.default_log_retention)
+            result = self.db.logs.update_many(
+                {"level": level, "expire_at": {"$exists": False}, "timestamp": {"$type": "date"}},
+                [{"$set": {"expire_at": {"$add": ["$timestamp", int(retention.total_seconds() * 1000)]}}}]
+            )
+            if result.modified_count:
+                logging.info(f"Set expiry on {result.modified_count} existing {level} logs.")
+
     # User management
     def create_user(self, username, password, role='editor'):
         """
@@ -32,6 +353,7 @@ class Database:
         }
         self.db.users.insert_one(user_doc)
         logging.info(f"User {username} created.")
+        self._notify("user", {"user_id": str(user_doc["_id"]), "username": username})
 
     def authenticate_user(self, username, password):
         """
@@ -42,10 +364,38 @@ class Database:
             return user
         return None
 
+    def get_user(self, user_id):
+        """
+        Gets a user by id (without the password hash), or None.
+        """
+        return self.db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+
+    def update_user(self, user_id, password=None, role=None):
+        """
+        Changes a user's password and/or role. Returns True if the user exists.
+        """
+        fields = {"updated_at": datetime.utcnow()}
+        if password is not None:
+            fields["password"] = generate_password_hash(password)
+        if role is not None:
+            fields["role"] = role
+        result = self.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": fields})
+        self._notify("user", {"user_id": str(user_id)})
+        return result.matched_count == 1
+
+    def delete_user(self, user_id):
+        """
+        Deletes a user. Returns True if the user existed.
+        """
+        result = self.db.users.delete_one({"_id": ObjectId(user_id)})
+        self._notify("user", {"user_id": str(user_id)})
+        return result.deleted_count == 1
+
     # Posts and analytics
-    def add_posted_reel(self, account_username, reel_data, analytics=None):
+    def add_posted_reel(self, account_username, reel_data, analytics=None, media_id=None, next_analytics_at=None):
         """
-        Adds a posted reel with analytics.
+        Adds a posted reel with analytics. media_id is the id of the uploaded media, which
+        the analytics refresher polls from next_analytics_at on.
         """
         doc = {
             "account_username": account_username,
@@ -55,17 +405,137 @@ class Database:
             "owner_username": reel_data.owner_username,
             "analytics": analytics or {}
         }
+        if media_id:
+            doc["media_id"] = str(media_id)
+            if next_analytics_at is not None:
+                doc["next_analytics_at"] = next_analytics_at
         self.db.posts.insert_one(doc)
+        self._add_to_daily_rollup(account_username, doc["post_date"], dict(
+            {"posts": 1}, **{metric: (doc["analytics"].get(metric) or 0) for metric in ANALYTICS_METRICS}
+        ))
+        self.db.available_reels.update_one(
+            {"account_username": account_username, "shortcode": reel_data.shortcode},
+            {"$set": {"posted": True}}
+        )
+        self.bump_change_counter(account_username, "reels")
         logging.info(f"Posted reel {reel_data.shortcode} added to database.")
+        self._notify("post", {"account_username": account_username, "shortcode": reel_data.shortcode, "status": "posted"})
+
+    def is_posted(self, account_username, shortcode):
+        """
+        Returns True if the account already posted the shortcode.
+        """
+        return self.db.posts.find_one({"account_username": account_username, "shortcode": shortcode}, {"_id": 1}) is not None
 
-    def update_post_analytics(self, shortcode, analytics):
+    def update_post_analytics(self, shortcode, analytics, account_username=None):
         """
-        Updates analytics for a post.
+        Updates analytics for a post and adds the change since the last update to the
+        account's daily rollup.
         """
-        self.db.posts.update_one(
-            {"shortcode": shortcode},
-            {"$set": {"analytics": analytics, "last_updated": datetime.utcnow()}}
+        query = {"shortcode": shortcode}
+        if account_username:
+            query["account_username"] = account_username
+        previous = self.db.posts.find_one_and_update(
+            query,
+            {"$set": {"analytics": analytics, "last_updated": datetime.utcnow()}},
+            projection={"_id": 0, "account_username": 1, "analytics": 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if previous is None:
+            return
+        now = datetime.utcnow()
+        old = previous.get("analytics") or {}
+        deltas = {metric: (analytics.get(metric) or 0) - (old.get(metric) or 0) for metric in ANALYTICS_METRICS}
+        self._add_to_daily_rollup(previous["account_username"], now, deltas)
+        self.bump_change_counter(previous["account_username"], "reels")
+        # Keep every reading, the post itself only holds the latest
+        self.db.analytics_history.insert_one(dict(
+            {"timestamp": now, "post": {"account_username": previous["account_username"], "shortcode": shortcode}},
+            **{metric: analytics.get(metric) or 0 for metric in ANALYTICS_METRICS}
+        ))
+
+    def get_analytics_history(self, account_username, shortcode):
+        """
+        Gets every analytics reading of a post, oldest first.
+        """
+        return list(self.db.analytics_history.find(
+            {"post.account_username": account_username, "post.shortcode": shortcode},
+            {"_id": 0, "post": 0}
+        ).sort("timestamp", ASCENDING))
+
+    def claim_analytics_due(self, account_username, now, lease):
+        """
+        Claims an account's most overdue post whose analytics refresh is due, by moving its
+        next_analytics_at lease past now, so no other worker polls it meanwhile; a claim that
+        is never rescheduled falls due again then. Returns the post as it was, or None.
+        Only posts still on the refresh schedule carry next_analytics_at, so old posts cost nothing.
+        """
+        return self.db.posts.find_one_and_update(
+            {"account_username": account_username, "next_analytics_at": {"$lte": now}},
+            {"$set": {"next_analytics_at": now + lease}},
+            projection={"shortcode": 1, "media_id": 1, "post_date": 1, "next_analytics_at": 1},
+            sort=[("next_analytics_at", ASCENDING)]
+        )
+
+    def schedule_analytics_refresh(self, account_username, shortcode, next_analytics_at):
+        """
+        Sets when a post's analytics are next polled, or takes it off the schedule with None.
+        """
+        if next_analytics_at is None:
+            update = {"$unset": {"next_analytics_at": ""}}
+        else:
+            update = {"$set": {"next_analytics_at": next_analytics_at}}
+        self.db.posts.update_one({"account_username": account_username, "shortcode": shortcode}, update)
+
+    def _add_to_daily_rollup(self, account_username, when, increments):
+        """
+        Adds counts to an account's analytics_daily document for the UTC day of when.
+        Metric gains are counted on the day they were observed, posts on the day they were posted.
+        """
+        increments = {field: value for field, value in increments.items() if value}
+        if not increments:
+            return
+        day = datetime(when.year, when.month, when.day)
+        self.db.analytics_daily.update_one(
+            {"account_username": account_username, "day": day},
+            {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def get_analytics_totals(self, account_username):
+        """
+        Sums an account's post count and analytics server-side.
+        """
+        totals = list(self.db.posts.aggregate([
+            {"$match": {"account_username": account_username}},
+            {"$group": dict(
+                {"_id": None, "posts": {"$sum": 1}},
+                **{metric: {"$sum": {"$ifNull": [f"$analytics.{metric}", 0]}} for metric in ANALYTICS_METRICS}
+            )}
+        ]))
+        if not totals:
+            return dict({"posts": 0}, **{metric: 0 for metric in ANALYTICS_METRICS})
+        totals[0].pop("_id")
+        return totals[0]
+
+    def get_daily_analytics(self, account_username, start, end=None):
+        """
+        Gets an account's daily rollups from start (inclusive) to end (exclusive), oldest first.
+        """
+        day_range = {"$gte": start}
+        if end is not None:
+            day_range["$lt"] = end
+        return list(self.db.analytics_daily.find(
+            {"account_username": account_username, "day": day_range},
+            {"_id": 0, "updated_at": 0}
+        ).sort("day", ASCENDING))
+
+    def get_posts_page(self, account_username, before=None, limit=50):
+        """
+        Gets one page of an account's posts, newest first. See _page.
+        """
+        projection = {"shortcode": 1, "caption": 1, "post_date": 1, "owner_username": 1, "analytics": 1}
+        return self._page(self.db.posts, {"account_username": account_username}, projection, before, limit)
 
     def get_posts(self, account_username=None):
         """
@@ -80,43 +550,182 @@ class Database:
     def add_available_reels(self, account_username, posts):
         """
         Adds fetched reels to the available collection for an account.
+        Reels that are already known are left untouched.
         """
-        docs = [{
-            "account_username": account_username,
-            "shortcode": p.shortcode,
-            "owner_username": p.owner_username,
-            "caption": p.caption,
-            "date": p.date
-        } for p in posts]
+        requests = [self._available_reel_upsert(account_username, p) for p in posts]
+        if not requests:
+            return
         try:
-            self.db.available_reels.insert_many(docs, ordered=False)
-            logging.info(f"Added {len(docs)} reels to available collection for {account_username}.")
+            result = self.db.available_reels.bulk_write(requests, ordered=False)
+            if result.upserted_count:
+                self.bump_change_counter(account_username, "reels")
+            logging.info(f"Added {result.upserted_count} new reels to available collection for {account_username}.")
         except Exception as e:
             logging.error(f"Error adding available reels: {e}")
 
-    def get_available_not_posted(self, account_username):
+    def add_available_reels_for_subscribers(self, subscribers, reels_by_source):
         """
-        Gets available reels that haven't been posted yet for an account.
+        Fans reels fetched once per source out to every account subscribed to that source,
+        in a single bulk write. subscribers maps a source username to account usernames.
+        Returns False if the write failed.
         """
-        posted_shortcodes = [doc["shortcode"] for doc in self.db.posts.find({"account_username": account_username}, {"shortcode": 1, "_id": 0})]
-        return list(self.db.available_reels.find({
-            "account_username": account_username,
-            "shortcode": {"$nin": posted_shortcodes}
-        }))
+        requests = []
+        request_accounts = []
+        for source, posts in reels_by_source.items():
+            for p in posts:
+                cached = self._post_cache_fields(p)
+                for account_username in subscribers.get(source, []):
+                    requests.append(self._available_reel_upsert(account_username, p, cached))
+                    request_accounts.append(account_username)
+        if not requests:
+            return True
+        try:
+            result = self.db.available_reels.bulk_write(requests, ordered=False)
+            # upserted_ids maps request positions to new ids; only bump accounts that gained reels
+            changed = {request_accounts[index] for index in result.upserted_ids}
+            for account_username in changed:
+                self.bump_change_counter(account_username, "reels")
+            logging.info(f"Added {result.upserted_count} new reels to available collection for {len(changed)} accounts.")
+            return True
+        except Exception as e:
+            logging.error(f"Error adding available reels: {e}")
+            return False
+
+    def refresh_available_reel(self, account_username, post):
+        """
+        Replaces the cached post node of an available reel after a live fetch.
+        """
+        cached = self._post_cache_fields(post)
+        if cached:
+            self.db.available_reels.update_one(
+                {"account_username": account_username, "shortcode": post.shortcode},
+                {"$set": cached}
+            )
+
+    def _available_reel_upsert(self, account_username, post, cached=None):
+        update = {"$setOnInsert": {
+            "owner_username": post.owner_username,
+            "caption": post.caption,
+            "date": post.date,
+            "posted": False
+        }}
+        if cached is None:
+            cached = self._post_cache_fields(post)
+        if cached:
+            update["$set"] = cached
+        return UpdateOne({"account_username": account_username, "shortcode": post.shortcode}, update, upsert=True)
+
+    def _post_cache_fields(self, post):
+        """
+        Captures the post node instaloader already returned, so posting can rebuild the
+        post without another request. Read straight from the node to avoid lazy fetches.
+        """
+        node = dict(getattr(post, '_node', None) or {})
+        if not node:
+            return {}
+        node["owner"] = {**node.get("owner", {}), "id": post.owner_id, "username": post.owner_username}
+        dimensions = node.get("dimensions") or {}
+        return {
+            "node": node,
+            "media": {
+                "video_url": node.get("video_url"),
+                "thumbnail_url": node.get("display_url"),
+                "width": dimensions.get("width"),
+                "height": dimensions.get("height"),
+                "duration": node.get("video_duration")
+            },
+            "node_fetched_at": datetime.utcnow()
+        }
+
+    def get_available_not_posted(self, account_username, projection=None):
+        """
+        Returns a cursor over available reels that haven't been posted yet for an account.
+        """
+        if projection is None:
+            projection = {"_id": 0, "shortcode": 1, "owner_username": 1, "caption": 1, "date": 1}
+        return self.db.available_reels.find(self._postable(account_username), projection)
+
+    def get_available_page(self, account_username, before=None, limit=50):
+        """
+        Gets one page of an account's unposted available reels, newest first. See _page.
+        """
+        projection = {"shortcode": 1, "owner_username": 1, "caption": 1, "date": 1}
+        return self._page(self.db.available_reels, self._postable(account_username), projection, before, limit)
+
+    def count_available_not_posted(self, account_username):
+        """
+        Counts available reels that haven't been posted yet for an account.
+        """
+        return self.db.available_reels.count_documents(self._postable(account_username))
+
+    def _postable(self, account_username):
+        """
+        Query for an account's available reels that are still candidates for posting: not
+        posted, and not given up on by a failed post job.
+        """
+        return {"account_username": account_username, "posted": False, "job_failed": {"$ne": True}}
+
+    def get_random_available_not_posted(self, account_username, exclude=None):
+        """
+        Picks one random unposted reel for an account on the server, or None if there are none.
+        exclude is a short list of shortcodes to skip.
+        """
+        match = self._postable(account_username)
+        if exclude:
+            match["shortcode"] = {"$nin": list(exclude)}
+        docs = list(self.db.available_reels.aggregate([
+            {"$match": match},
+            {"$sample": {"size": 1}},
+            {"$project": {"_id": 0, "shortcode": 1, "owner_username": 1, "caption": 1, "date": 1,
+                          "node": 1, "media": 1, "node_fetched_at": 1}}
+        ]))
+        return docs[0] if docs else None
+
+    def filter_unposted(self, account_username, shortcodes):
+        """
+        Returns the subset of shortcodes that are still unposted for an account.
+        """
+        docs = self.db.available_reels.find(
+            dict(self._postable(account_username), shortcode={"$in": list(shortcodes)}),
+            {"_id": 0, "shortcode": 1}
+        )
+        return {doc["shortcode"] for doc in docs}
+
+    # Source cursors
+    def get_source_cursors(self, source_usernames):
+        """
+        Gets the scraping high-water marks for a list of source accounts, keyed by source username.
+        """
+        docs = self.db.source_cursors.find({"source_username": {"$in": list(source_usernames)}}, {"_id": 0})
+        return {doc.pop("source_username"): doc for doc in docs}
+
+    def update_source_cursors(self, cursors):
+        """
+        Saves scraping high-water marks keyed by source username.
+        """
+        requests = [
+            UpdateOne({"source_username": source}, {"$set": cursor}, upsert=True)
+            for source, cursor in cursors.items() if cursor
+        ]
+        if requests:
+            self.db.source_cursors.bulk_write(requests, ordered=False)
 
     # Queue management
     def add_to_queue(self, account_username, shortcode, scheduled_time):
         """
-        Adds a reel to the posting queue.
+        Adds a reel to the posting queue. Re-adding a shortcode reschedules it.
         """
-        doc = {
-            "account_username": account_username,
-            "shortcode": shortcode,
-            "scheduled_time": scheduled_time,
-            "status": "pending",
-            "created_at": datetime.utcnow()
-        }
-        self.db.queue.insert_one(doc)
+        self.db.queue.update_one(
+            {"account_username": account_username, "shortcode": shortcode},
+            {
+                "$set": {"scheduled_time": scheduled_time, "status": "pending", "attempts": 0,
+                         "last_error": None, "updated_at": datetime.utcnow()},
+                "$unset": {"claimed_by": "", "lease_expires_at": ""},
+                "$setOnInsert": {"created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+        self._notify("queue", {"account_username": account_username, "shortcode": shortcode, "status": "pending"})
 
     def get_queue(self, account_username=None):
         """
@@ -127,19 +736,203 @@ class Database:
             query["account_username"] = account_username
         return list(self.db.queue.find(query, {"_id": 0}))
 
-    def update_queue_status(self, shortcode, status):
+    def update_queue_status(self, account_username, shortcode, status):
         """
-        Updates the status of a queued item.
+        Updates the status of one account's queued item.
         """
         self.db.queue.update_one(
-            {"shortcode": shortcode},
+            {"account_username": account_username, "shortcode": shortcode},
             {"$set": {"status": status, "updated_at": datetime.utcnow()}}
         )
+        self._notify("queue", {"account_username": account_username, "shortcode": shortcode, "status": status})
+
+    def claim_queue_item(self, worker_id, lease):
+        """
+        Atomically claims the most overdue pending item, or an in_progress item whose lease
+        expired, marking it in_progress for worker_id until the lease runs out. Returns the item or None.
+        """
+        now = datetime.utcnow()
+        item = self.db.queue.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "scheduled_time": {"$lte": now}},
+                {"status": "in_progress", "lease_expires_at": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "in_progress", "claimed_by": worker_id, "claimed_at": now,
+                         "lease_expires_at": now + lease, "updated_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("scheduled_time", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if item:
+            self._notify("queue", {"account_username": item["account_username"], "shortcode": item["shortcode"], "status": "in_progress"})
+        return item
+
+    def renew_queue_lease(self, item_id, worker_id, lease):
+        """
+        Extends a claimed item's lease. Returns False if the claim was lost to another worker.
+        """
+        result = self.db.queue.update_one(
+            {"_id": item_id, "status": "in_progress", "claimed_by": worker_id},
+            {"$set": {"lease_expires_at": datetime.utcnow() + lease}}
+        )
+        return result.matched_count == 1
+
+    def finish_queue_item(self, item, worker_id, error=None, max_attempts=3, retry_delay=timedelta(minutes=10)):
+        """
+        Marks a claimed item done, or on error puts it back to pending after retry_delay
+        (growing with each attempt) until max_attempts is reached, then marks it failed.
+        Returns the new status, or None if the claim was lost.
+        """
+        now = datetime.utcnow()
+        if error is None:
+            status, fields = "done", {"completed_at": now, "last_error": None}
+        elif item.get("attempts", 1) >= max_attempts:
+            status, fields = "failed", {"last_error": error}
+        else:
+            status, fields = "pending", {"last_error": error, "scheduled_time": now + retry_delay * item.get("attempts", 1)}
+        result = self.db.queue.update_one(
+            {"_id": item["_id"], "status": "in_progress", "claimed_by": worker_id},
+            {"$set": {"status": status, "updated_at": now, **fields},
+             "$unset": {"claimed_by": "", "lease_expires_at": ""}}
+        )
+        if result.matched_count != 1:
+            return None
+        self._notify("queue", {"account_username": item["account_username"], "shortcode": item["shortcode"], "status": status})
+        return status
+
+    def next_queue_time(self):
+        """
+        Returns the earliest scheduled_time of a pending item, or None.
+        """
+        item = self.db.queue.find_one(
+            {"status": "pending"}, {"_id": 0, "scheduled_time": 1}, sort=[("scheduled_time", ASCENDING)]
+        )
+        return item["scheduled_time"] if item else None
+
+    # Post jobs
+    def start_post_job(self, account_username, doc, worker_id):
+        """
+        Starts a post job for an account's available_reels doc, or returns the job already
+        already open, done or failed for good for that reel. The job key (account:shortcode) is
+        its idempotency key: one reel is only ever worked on by one job per account. A job that
+        failed before anything was uploaded starts over.
+        """
+        now = datetime.utcnow()
+        key = f"{account_username}:{doc['shortcode']}"
+        try:
+            job = self.db.jobs.find_one_and_update(
+                # A failed job whose upload may have gone through is never restarted
+                {"key": key, "status": "failed", "upload_started_at": {"$exists": False}},
+                {
+                    "$set": {"status": "active", "stage": JOB_STAGES[0], "doc": doc, "attempts": 0,
+                             "last_error": None, "worker_id": worker_id, "updated_at": now,
+                             "stage_times": {JOB_STAGES[0]: now}},
+                    "$unset": {"media_id": "", "upload_started_at": "", "finished_at": ""},
+                    "$setOnInsert": {"account_username": account_username, "shortcode": doc["shortcode"], "created_at": now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Already active (resume it), done, or failed after an upload attempt
+            job = self.db.jobs.find_one({"key": key})
+        return job
+
+    def get_open_post_job(self, account_username, shortcode=None):
+        """
+        Returns an account's oldest unfinished post job (for one shortcode if given), or None.
+        """
+        query = {"account_username": account_username, "status": "active"}
+        if shortcode:
+            query["shortcode"] = shortcode
+        return self.db.jobs.find_one(query, sort=[("created_at", ASCENDING)])
+
+    def update_post_job(self, job, stage=None, **fields):
+        """
+        Records fields on a job and, with stage, moves it on to that stage. The write only
+        applies if the job is still at the stage the caller read, so a stale worker can't
+        move it backwards. Reaching the last stage finishes the job. Updates job in place and
+        returns False if the job had moved on meanwhile.
+        """
+        now = datetime.utcnow()
+        update = dict(fields, updated_at=now)
+        if stage is not None:
+            update["stage"] = stage
+            update[f"stage_times.{stage}"] = now
+            if stage == JOB_STAGES[-1]:
+                update["status"] = "done"
+                update["finished_at"] = now
+        result = self.db.jobs.update_one({"_id": job["_id"], "stage": job["stage"], "status": "active"}, {"$set": update})
+        if result.matched_count != 1:
+            return False
+        job.update({field: value for field, value in update.items() if '.' not in field})
+        if stage is not None:
+            job.setdefault("stage_times", {})[stage] = now
+        return True
+
+    def fail_post_job(self, job, error, max_attempts=3):
+        """
+        Records a failed attempt at a job. It stays at its last completed stage to be resumed,
+        until max_attempts is reached and it is marked failed, which also takes its reel out of
+        selection (see exclude_failed_reel). Returns the new status.
+        """
+        now = datetime.utcnow()
+        attempts = job.get("attempts", 0) + 1
+        status = "failed" if attempts >= max_attempts else "active"
+        fields = {"attempts": attempts, "last_error": error, "status": status, "updated_at": now}
+        if status == "failed":
+            fields["finished_at"] = now
+        self.db.jobs.update_one({"_id": job["_id"], "status": "active"}, {"$set": fields})
+        job.update(fields)
+        if status == "failed":
+            self.exclude_failed_reel(job["account_username"], job["shortcode"])
+        return status
+
+    def exclude_failed_reel(self, account_username, shortcode):
+        """
+        Flags an available reel whose post job failed for good, so selection and prefetch
+        stop picking it. A queued post of the shortcode can still retry it explicitly.
+        """
+        result = self.db.available_reels.update_one(
+            {"account_username": account_username, "shortcode": shortcode, "job_failed": {"$ne": True}},
+            {"$set": {"job_failed": True}}
+        )
+        if result.modified_count:
+            # The reel leaves the available list and count, so cached /api/reels pages are stale
+            self.bump_change_counter(account_username, "reels")
+
+    def get_available_reel(self, account_username, shortcode):
+        """
+        Gets one account's available_reels doc for a shortcode, or None.
+        """
+        return self.db.available_reels.find_one(
+            {"account_username": account_username, "shortcode": shortcode},
+            {"_id": 0, "shortcode": 1, "owner_username": 1, "caption": 1, "date": 1,
+             "node": 1, "media": 1, "node_fetched_at": 1}
+        )
+
+    # Change notifications
+    def add_listener(self, callback):
+        """
+        Registers callback(kind, payload) to be called after queue, post and user ("user")
+        changes and for each activity log entry ("log").
+        Callbacks run on the writing thread and must not block.
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, kind, payload):
+        for callback in list(self.listeners):
+            try:
+                callback(kind, payload)
+            except Exception as e:
+                logging.error(f"Error in {kind} listener: {e}")
 
     # Logging
     def log_activity(self, level, message, account_username=None, action_type=None):
         """
-        Logs an activity.
+        Logs an activity. The entry is buffered and written in the background.
         """
         doc = {
             "timestamp": datetime.utcnow(),
@@ -148,7 +941,91 @@ class Database:
             "account_username": account_username,
             "action_type": action_type
         }
-        self.db.logs.insert_one(doc)
+        doc["expire_at"] = doc["timestamp"] + self.log_retention.get(str(level).upper(), self.default_log_retention)
+        self._notify("log", dict(doc))
+        self.log_buffer.put(doc)
+
+    def get_logs_page(self, account_username, before=None, limit=50):
+        """
+        Gets one page of an account's logs, newest first. See _page.
+        """
+        projection = {"timestamp": 1, "level": 1, "message": 1, "action_type": 1}
+        query = {"account_username": account_username}
+        if self.recent_logs_bytes and not before:
+            # The first page usually fits in the capped hot tier; fall back if it doesn't fill it
+            docs, next_cursor = self._page(self.db.logs_recent, query, projection, None, limit)
+            if next_cursor:
+                return docs, next_cursor
+        return self._page(self.db.logs, query, projection, before, limit)
+
+    def _page(self, collection, query, projection, before=None, limit=50):
+        """
+        Keyset pagination on _id, newest first: returns (docs, next_cursor), where next_cursor is
+        the string to pass as before for the following page, or None on the last page.
+        The _id is not returned in the docs.
+        """
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        if before:
+            query = dict(query, _id={"$lt": ObjectId(before)})
+        docs = list(collection.find(query, projection).sort("_id", -1).limit(limit + 1))
+        next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+        docs = docs[:limit]
+        for doc in docs:
+            del doc["_id"]
+        return docs, next_cursor
+
+    def count_posts(self, account_username):
+        """
+        Counts an account's posts.
+        """
+        return self.db.posts.count_documents({"account_username": account_username})
+
+    # Metrics
+    def record_cycle_metrics(self, summary):
+        """
+        Stores one posting cycle's summary in cycle_metrics; old summaries expire via TTL.
+        """
+        self.db.cycle_metrics.insert_one(dict(summary, timestamp=datetime.utcnow()))
+
+    def get_cycle_metrics(self, limit=50):
+        """
+        Gets the most recent cycle summaries, newest first.
+        """
+        return list(self.db.cycle_metrics.find({}, {"_id": 0}).sort("timestamp", -1).limit(limit))
+
+    # Change counters
+    def bump_change_counter(self, account_username, kind, amount=1):
+        """
+        Increments an account's counter for kind ("reels" or "logs"), which the dashboard API
+        turns into validators so unchanged data can be answered with 304 Not Modified.
+        """
+        self.db.change_counters.update_one(
+            {"account_username": account_username},
+            {"$inc": {kind: amount}},
+            upsert=True
+        )
+
+    def get_change_counter(self, account_username, kind):
+        """
+        Gets an account's counter for kind, 0 if nothing has changed yet.
+        """
+        doc = self.db.change_counters.find_one({"account_username": account_username}, {"_id": 0, kind: 1})
+        return (doc or {}).get(kind, 0)
+
+    def _logs_flushed(self, batch):
+        """
+        Log buffer callback: copies the batch into logs_recent if enabled and bumps each
+        account's logs counter once per flushed batch.
+        """
+        if self.recent_logs_bytes:
+            # Same documents and _ids as in logs, so pages continue seamlessly into logs
+            self.db.logs_recent.insert_many(batch, ordered=False)
+        accounts = {doc.get("account_username") for doc in batch if doc.get("account_username")}
+        if accounts:
+            self.db.change_counters.bulk_write([
+                UpdateOne({"account_username": account_username}, {"$inc": {"logs": 1}}, upsert=True)
+                for account_username in accounts
+            ], ordered=False)
 
     def get_logs(self, account_username=None, limit=100):
         """
@@ -159,6 +1036,39 @@ class Database:
             query["account_username"] = account_username
         return list(self.db.logs.find(query, {"_id": 0}).sort("timestamp", -1).limit(limit))
 
+    def get_logs_between(self, start, end):
+        """
+        Returns a cursor over all logs written between start (inclusive) and end (exclusive),
+        oldest first. Ranges over _id, whose embedded write time is already indexed.
+        """
+        return self.db.logs.find(
+            {"_id": {"$gte": ObjectId.from_datetime(start), "$lt": ObjectId.from_datetime(end)}},
+            {"_id": 0}
+        ).sort("_id", ASCENDING)
+
+    def get_oldest_log_time(self):
+        """
+        Returns the (UTC, naive) write time of the oldest log, or None.
+        """
+        doc = self.db.logs.find_one({}, {"_id": 1}, sort=[("_id", ASCENDING)])
+        return doc["_id"].generation_time.replace(tzinfo=None) if doc else None
+
+    def get_archived_log_days(self):
+        """
+        Returns the days whose logs have already been archived.
+        """
+        return {doc["day"] for doc in self.db.log_archives.find({}, {"_id": 0, "day": 1})}
+
+    def record_log_archive(self, day, path, count):
+        """
+        Records that a day's logs were archived to path.
+        """
+        self.db.log_archives.update_one(
+            {"day": day},
+            {"$set": {"path": path, "count": count, "archived_at": datetime.utcnow()}},
+            upsert=True
+        )
+
     # Alerts
     def create_alert(self, user_id, condition, message, enabled=True):
         """
@@ -188,12 +1098,97 @@ class Database:
         last_time = status.get("last_post_time") if status else None
         return last_time.replace(tzinfo=timezone.utc) if last_time else None
 
-    def update_last_post_time(self, account_username, time):
+    def update_last_post_time(self, account_username, time, jitter_seconds=None):
         """
-        Updates the last post time for an account.
+        Updates the last post time for an account, optionally with the jitter added to its next slot.
+        Clears any pending retry of a failed attempt.
         """
+        fields = {"last_post_time": time}
+        if jitter_seconds is not None:
+            fields["jitter_seconds"] = jitter_seconds
         self.db.account_status.update_one(
             {"account_username": account_username},
-            {"$set": {"last_post_time": time}},
+            {"$set": fields, "$unset": {"retry_at": ""}},
             upsert=True
         )
+
+    def get_account_statuses(self, account_usernames):
+        """
+        Gets the last post time, slot jitter and retry time of a failed attempt of several
+        accounts in one query, keyed by account.
+        """
+        statuses = {}
+        for status in self.db.account_status.find(
+            {"account_username": {"$in": list(account_usernames)}},
+            {"_id": 0, "account_username": 1, "last_post_time": 1, "jitter_seconds": 1, "retry_at": 1}
+        ):
+            last_time = status.get("last_post_time")
+            retry_at = status.get("retry_at")
+            statuses[status["account_username"]] = {
+                "last_post_time": last_time.replace(tzinfo=timezone.utc) if last_time else None,
+                "jitter_seconds": status.get("jitter_seconds", 0),
+                "retry_at": retry_at.replace(tzinfo=timezone.utc) if retry_at else None
+            }
+        return statuses
+
+    def acquire_account_lease(self, account_username, holder, ttl, last_post_time=None, check_last_post_time=True):
+        """
+        Atomically claims an account for holder until ttl from now, if no other worker holds a live lease.
+        With check_last_post_time, the claim also requires the account's last_post_time to still equal
+        the value the caller based its "due" decision on, so a post made meanwhile by another
+        worker is noticed. Returns True if the lease was acquired.
+        """
+        now = datetime.utcnow()
+        conditions = [{"$or": [
+            {"lease_holder": None},
+            {"lease_holder": holder},
+            {"lease_expires_at": {"$lt": now}}
+        ]}]
+        if check_last_post_time:
+            conditions.append({"last_post_time": last_post_time})
+        try:
+            result = self.db.account_status.update_one(
+                {"account_username": account_username, "$and": conditions},
+                {"$set": {"lease_holder": holder, "lease_expires_at": now + ttl, "lease_acquired_at": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The status exists but didn't match: leased elsewhere or posted meanwhile
+            return False
+        if result.upserted_id is not None and self.db.account_status.count_documents(
+                {"account_username": account_username}, limit=2) > 1:
+            # Without the unique index a status that didn't match is duplicated instead of rejected
+            self.db.account_status.delete_one({"_id": result.upserted_id})
+            logging.error(f"Account status of {account_username} is not unique; is the account_unique index missing?")
+            return False
+        return result.matched_count == 1 or result.upserted_id is not None
+
+    def renew_account_lease(self, account_username, holder, ttl):
+        """
+        Extends holder's lease on an account. Returns False if the lease was lost.
+        """
+        result = self.db.account_status.update_one(
+            {"account_username": account_username, "lease_holder": holder},
+            {"$set": {"lease_expires_at": datetime.utcnow() + ttl}}
+        )
+        return result.matched_count == 1
+
+    def release_account_lease(self, account_username, holder, last_post_time=None, jitter_seconds=None, retry_at=None):
+        """
+        Releases holder's lease on an account, recording last_post_time (and its next slot's jitter)
+        in the same write, or retry_at after a failed attempt. Returns False if the lease had already been lost.
+        """
+        fields = {}
+        unset = {"lease_holder": "", "lease_expires_at": "", "lease_acquired_at": ""}
+        if last_post_time is not None:
+            fields["last_post_time"] = last_post_time
+            unset["retry_at"] = ""
+        if jitter_seconds is not None:
+            fields["jitter_seconds"] = jitter_seconds
+        if retry_at is not None:
+            fields["retry_at"] = retry_at
+        update = {"$unset": unset}
+        if fields:
+            update["$set"] = fields
+        result = self.db.account_status.update_one({"account_username": account_username, "lease_holder": holder}, update)
+        return result.matched_count == 1
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import instaloader
+from instagrapi.exceptions import (
+    LoginRequired, ChallengeRequired, BadPassword, ReloginAttemptExceeded, TwoFactorRequired,
+    PleaseWaitFewMinutes, RateLimitError, ClientThrottledError, FeedbackRequired,
+    ClientConnectionError, ClientRequestTimeout, ClientIncompleteReadError, ClientJSONDecodeError,
+    ClientBadRequestError, ClientForbiddenError, ClientNotFoundError, MediaNotFound, UserNotFound
+)
+from tenacity import Retrying, AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_exception
+from rate_limit import looks_throttled
+from metrics import count_retry
+
+# Kinds of error an Instagram call can fail with
+TRANSIENT = "transient"          # network trouble or a flaky response: worth retrying soon
+RATE_LIMITED = "rate_limited"    # Instagram wants us to slow down: the rate limiter backs off
+AUTH = "auth"                    # the account's session is unusable until it logs in again
+PERMANENT = "permanent"          # retrying the same call can't help
+
+# instagrapi errors that mean the session itself is no longer usable
+AUTH_ERRORS = (LoginRequired, ChallengeRequired, BadPassword, ReloginAttemptExceeded, TwoFactorRequired)
+
+# Errors that mean Instagram is rate limiting the caller
+THROTTLE_ERRORS = (PleaseWaitFewMinutes, RateLimitError, ClientThrottledError, FeedbackRequired,
+                   instaloader.TooManyRequestsException)
+
+PERMANENT_ERRORS = (
+    ClientBadRequestError, ClientForbiddenError, ClientNotFoundError, MediaNotFound, UserNotFound,
+    instaloader.ProfileNotExistsException, instaloader.QueryReturnedNotFoundException,
+    instaloader.PrivateProfileNotFollowedException, instaloader.LoginRequiredException,
+    FileNotFoundError, PermissionError, TypeError, ValueError, KeyError, AttributeError
+)
+
+TRANSIENT_ERRORS = (
+    ClientConnectionError, ClientRequestTimeout, ClientIncompleteReadError, ClientJSONDecodeError,
+    instaloader.ConnectionException, ConnectionError, asyncio.TimeoutError, TimeoutError, OSError
+)
+
+# Retry policy of each operation class: (attempts, kinds retried). Uploads are only retried
+# when Instagram refused them outright; any other failure might have posted the reel, and
+# post jobs check for that before uploading again.
+RETRY_POLICIES = {
+    "scrape": (3, {TRANSIENT, RATE_LIMITED}),
+    "download": (3, {TRANSIENT, RATE_LIMITED}),
+    "read": (3, {TRANSIENT, RATE_LIMITED}),
+    "upload": (2, {RATE_LIMITED}),
+    "login": (1, set())
+}
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of making a call through a proxy (or to a source) whose circuit breaker is open.
+    """
+
+def classify(error):
+    """
+    Returns the kind of an exception raised by an Instagram call: TRANSIENT, RATE_LIMITED, AUTH or PERMANENT.
+    Known auth and permanent errors keep their kind whatever their message says.
+    Errors that aren't recognised are treated as transient.
+    """
+    # Throttle types go first: instaloader's 429 is also a ConnectionException
+    if isinstance(error, THROTTLE_ERRORS):
+        return RATE_LIMITED
+    if isinstance(error, AUTH_ERRORS):
+        return AUTH
+    if isinstance(error, (CircuitOpenError,) + PERMANENT_ERRORS):
+        return PERMANENT
+    if looks_throttled(error):
+        return RATE_LIMITED
+    return TRANSIENT
+
+def retrying(operation, is_async=True, exclude=()):
+    """
+    Returns a tenacity retrier applying operation's retry policy to a single call:
+    retrier(fn, *args, **kwargs). Exceptions of the types in exclude are never retried.
+    The last error is re-raised once attempts run out.
+    """
+    attempts, kinds = RETRY_POLICIES[operation]
+    retriable = lambda error: not isinstance(error, exclude) and classify(error) in kinds
+    retrier = AsyncRetrying if is_async else Retrying
+    return retrier(
+        stop=stop_after_attempt(attempts),
+        wait=wait_exponential(multiplier=1, min=float(os.getenv('RETRY_MIN_SECONDS', 4)),
+                              max=float(os.getenv('RETRY_MAX_SECONDS', 10))),
+        retry=retry_if_exception(retriable),
+        before_sleep=count_retry(operation),
+        reraise=True
+    )
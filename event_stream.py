@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from pymongo.errors import PyMongoError
+
+class EventBroadcaster:
+    def __init__(self, max_clients=None, history=None, client_queue_size=None):
+        """
+        Fans live dashboard events (new activity logs, post and queue state changes) out to
+        connected server-sent-event clients. Recent events are kept so a reconnecting client can
+        resume after its Last-Event-ID; ids are "<epoch>:<sequence>", so ids from before a restart
+        are recognised and answered with a reset event. Clients that fall behind are disconnected
+        and resume on reconnect.
+        """
+        self.max_clients = max_clients or int(os.getenv('SSE_MAX_CLIENTS', 20))
+        self.history = deque(maxlen=history or int(os.getenv('SSE_HISTORY', 1000)))
+        self.client_queue_size = client_queue_size or int(os.getenv('SSE_CLIENT_QUEUE_SIZE', 500))
+        self.epoch = format(int(time.time()), 'x')
+        self.source = None
+        self._sequence = 0
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def attach(self, db, source=None):
+        """
+        Starts feeding events from db: from a MongoDB change stream when source is 'change_stream'
+        (or 'auto' and the server supports one), otherwise from the writes made in this process.
+        Only a change stream sees writes made by other worker processes.
+        """
+        source = source or os.getenv('SSE_SOURCE', 'auto')
+        if source in ('auto', 'change_stream'):
+            try:
+                stream = self._watch(db)
+                self.source = 'change_stream'
+                threading.Thread(target=self._follow, args=(db, stream), name='sse-change-stream', daemon=True).start()
+                return
+            except PyMongoError as e:
+                # Change streams need a replica set or sharded cluster
+                logging.info(f"Change streams unavailable, streaming this process's writes: {e}")
+        self.source = 'local'
+        db.add_listener(self.on_change)
+
+    def on_change(self, kind, payload):
+        """
+        Database listener: publishes log, post and queue changes.
+        """
+        if kind in ('log', 'post', 'queue'):
+            self.publish(kind, payload)
+
+    def publish(self, kind, payload):
+        """
+        Records an event and queues it for every connected client. Never blocks the writer.
+        """
+        with self._lock:
+            self._sequence += 1
+            event = (self._sequence, kind, json.dumps(payload, default=str))
+            self.history.append(event)
+            for client in list(self._clients):
+                try:
+                    client.put_nowait(event)
+                except queue.Full:
+                    # Too slow to keep up; cut it off and let it resume from its last id
+                    self._clients.discard(client)
+                    client.closed = True
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a client and returns its event queue, preloaded with the events it missed
+        since last_event_id. Returns None when the connection limit is reached.
+        """
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            client = queue.Queue(maxsize=self.client_queue_size)
+            client.closed = False
+            if last_event_id:
+                for event in self._missed(last_event_id):
+                    client.put_nowait(event)
+            self._clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stats(self):
+        """
+        Returns connection and event counts.
+        """
+        with self._lock:
+            return {"clients": len(self._clients), "events": self._sequence, "source": self.source}
+
+    def stream(self, client, keepalive=15):
+        """
+        Yields the client's events as text/event-stream chunks, with a comment line every
+        keepalive seconds of silence, until the client is cut off or disconnects.
+        """
+        try:
+            yield "retry: 5000\n\n"
+            while not client.closed:
+                try:
+                    sequence, kind, data = client.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {self.epoch}:{sequence}\nevent: {kind}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def _missed(self, last_event_id):
+        epoch, _, sequence = last_event_id.partition(':')
+        oldest = self.history[0][0] if self.history else self._sequence + 1
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) + 1 < oldest:
+            # Restarted, or gone too long for the history to cover the gap: the client reloads
+            return [(self._sequence, 'reset', '{}')]
+        missed = [event for event in self.history if event[0] > int(sequence)]
+        if len(missed) >= self.client_queue_size:
+            # More than the client's queue holds (e.g. it was cut off for being slow): reload instead
+            return [(self._sequence, 'reset', '{}')]
+        return missed
+
+    def _watch(self, db, resume_after=None):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": "logs", "operationType": "insert"},
+            {"ns.coll": "posts", "operationType": "insert"},
+            {"ns.coll": "queue", "operationType": {"$in": ["insert", "update", "replace"]}}
+        ]}}]
+        return db.db.watch(pipeline, full_document='updateLookup', resume_after=resume_after)
+
+    def _follow(self, db, stream):
+        resume_token = None
+        while True:
+            try:
+                with stream:
+                    for change in stream:
+                        resume_token = change["_id"]
+                        self._publish_change(change)
+            except PyMongoError as e:
+                logging.error(f"Change stream interrupted, reopening: {e}")
+            time.sleep(5)
+            try:
+                # Pick up where the interrupted stream left off
+                stream = self._watch(db, resume_token)
+            except PyMongoError as e:
+                logging.error(f"Error reopening change stream: {e}")
+
+    def _publish_change(self, change):
+        doc = change.get("fullDocument") or {}
+        collection = change["ns"]["coll"]
+        if collection == "logs":
+            self.publish("log", {field: doc.get(field) for field in
+                                 ("timestamp", "level", "message", "account_username", "action_type")})
+        elif collection == "posts":
+            self.publish("post", {"account_username": doc.get("account_username"),
+                                  "shortcode": doc.get("shortcode"), "status": "posted"})
+        elif doc:
+            self.publish("queue", {"account_username": doc.get("account_username"),
+                                   "shortcode": doc.get("shortcode"), "status": doc.get("status")})
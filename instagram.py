@@ -2,22 +2,239 @@ import instaloader
 from instagrapi import Client
 from instagrapi.types import Media
 import os
-from datetime import datetime, timedelta
-import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import aiofiles
-from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
+from rate_limit import get_rate_limiter
+from metrics import timed, proxy_label
+from errors import classify, retrying, CircuitOpenError, TRANSIENT, RATE_LIMITED, AUTH, PERMANENT
+from circuit_breaker import get_circuit_breakers
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def account_labels(insta, *args, **kwargs):
+    """
+    Metric labels of an Instagram method call.
+    """
+    return {"account": insta.username, "proxy": insta.proxy}
+
+def cached_media_expired(doc, margin=timedelta(minutes=10)):
+    """
+    Returns True if the media URLs cached on an available_reels doc are missing or about to expire.
+    Instagram CDN URLs carry their expiry as a hex unix timestamp in the 'oe' query parameter;
+    without one the cache is trusted for MEDIA_URL_TTL_HOURS after it was fetched.
+    """
+    video_url = (doc.get("media") or {}).get("video_url")
+    fetched_at = doc.get("node_fetched_at")
+    if not doc.get("node") or not video_url or not fetched_at:
+        return True
+    now = datetime.utcnow()
+    try:
+        expires_at = datetime.utcfromtimestamp(int(parse_qs(urlparse(video_url).query)["oe"][0], 16))
+    except (KeyError, IndexError, ValueError):
+        expires_at = fetched_at + timedelta(hours=float(os.getenv('MEDIA_URL_TTL_HOURS', 12)))
+    return now + margin >= expires_at
+
+class LimitedRateController(instaloader.RateController):
+    def __init__(self, context, limiter, proxy=None):
+        """
+        Routes instaloader's own query pacing through the shared rate limiter ("scrape" endpoint
+        class), instead of its fixed sliding-window sleeps.
+        """
+        super().__init__(context)
+        self.limiter = limiter
+        self.proxy = proxy
+
+    def wait_before_query(self, query_type):
+        self.limiter.wait(self.proxy, "scrape")
+
+    def handle_429(self, query_type):
+        self.limiter.throttled(self.proxy, "scrape")
+        self.limiter.wait(self.proxy, "scrape")
+
+def new_loader(limiter=None):
+    """
+    Creates an anonymous Instaloader paced by the shared rate limiter.
+    """
+    limiter = limiter or get_rate_limiter()
+    return instaloader.Instaloader(user_agent=USER_AGENT, rate_controller=lambda context: LimitedRateController(context, limiter))
+
+class SourceFetcher:
+    def __init__(self, loader=None, max_workers=None, timeout=None):
+        """
+        Fetches reels from public source accounts through anonymous instaloader contexts.
+        instaloader is blocking, so each source is walked in a bounded thread pool with one
+        loader per worker thread. Passing a loader pins all work to that single loader.
+        Requests are paced by the shared rate limiter rather than fixed sleeps. A source that
+        keeps failing is skipped while its circuit breaker is open.
+        """
+        self.loader = loader
+        self.breakers = get_circuit_breakers()
+        if max_workers is None:
+            max_workers = int(os.getenv('SOURCE_FETCH_WORKERS', 4))
+        self.max_workers = 1 if loader is not None else max(max_workers, 1)
+        self.timeout = timeout if timeout is not None else float(os.getenv('SOURCE_FETCH_TIMEOUT', 120))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='source-fetch')
+        self._local = threading.local()
+
+    def close(self):
+        """
+        Shuts down the worker threads. Fetches that are still running stop at their next post.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def fetch_sources(self, usernames, max_posts=10, days_cutoff=7, cursors=None, full_scan_interval=timedelta(hours=24)):
+        """
+        Asynchronously fetches public reels from each source username once.
+        Returns a dict of source username to reels; see iter_sources for how cursors are used.
+        """
+        reels_by_source = {}
+        async for username, reels in self.iter_sources(usernames, max_posts, days_cutoff, cursors, full_scan_interval):
+            reels_by_source[username] = reels
+        return reels_by_source
+
+    async def iter_sources(self, usernames, max_posts=10, days_cutoff=7, cursors=None, full_scan_interval=timedelta(hours=24)):
+        """
+        Fetches several source usernames in parallel and yields (username, reels) as each one finishes.
+        Sources that fail or time out are logged and skipped. A failed fetch is retried on its own
+        (timeouts aren't, they already took the whole budget), and the source's circuit breaker
+        counts the failure. cursors maps a source username to its high-water mark (see fetch_source);
+        it is updated in place so the caller can persist it.
+        """
+        cutoff_date = datetime.now() - timedelta(days=days_cutoff)
+        if cursors is None:
+            cursors = {}
+        slots = asyncio.Semaphore(self.max_workers)
+        results = asyncio.Queue()
+
+        async def fetch(username):
+            breaker = self.breakers.get("source", username)
+            if not breaker.allow():
+                logging.info(f"Skipping @{username}: too many recent failures.")
+                return
+            async with slots:
+                try:
+                    logging.info(f"Fetching reels from @{username}...")
+                    reels, cursors[username] = await retrying("scrape", exclude=(asyncio.TimeoutError,))(
+                        self.fetch_source, username, max_posts, cutoff_date, cursors.get(username), full_scan_interval
+                    )
+                    breaker.record_success()
+                    await results.put((username, reels))
+                except instaloader.ProfileNotExistsException:
+                    logging.warning(f"Profile @{username} does not exist.")
+                    breaker.record_failure(permanent=True)
+                except asyncio.TimeoutError:
+                    logging.error(f"Timed out after {self.timeout:.0f}s fetching from @{username}.")
+                    breaker.record_failure()
+                except Exception as e:
+                    logging.error(f"An error occurred while fetching from @{username}: {e}")
+                    kind = classify(e)
+                    if kind in (TRANSIENT, PERMANENT):
+                        breaker.record_failure(permanent=kind == PERMANENT)
+
+        async def fetch_all():
+            try:
+                await asyncio.gather(*(fetch(username) for username in dict.fromkeys(usernames)))
+            finally:
+                await results.put(None)
+
+        runner = asyncio.create_task(fetch_all())
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            if not runner.done():
+                runner.cancel()
+
+    @timed("fetch_source", lambda fetcher, username, *args, **kwargs: {"account": username})
+    async def fetch_source(self, username, max_posts, cutoff_date, cursor=None, full_scan_interval=timedelta(hours=24)):
+        """
+        Fetches up to max_posts recent reels from one source account on a worker thread, within the timeout.
+        Returns the reels and the updated cursor.
+        """
+        cancelled = threading.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self._fetch_source_blocking,
+            username, max_posts, cutoff_date, cursor, full_scan_interval, cancelled
+        )
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            cancelled.set()
+            raise
+
+    def _get_loader(self):
+        if self.loader is not None:
+            return self.loader
+        loader = getattr(self._local, 'loader', None)
+        if loader is None:
+            loader = self._local.loader = new_loader()
+        return loader
+
+    def _fetch_source_blocking(self, username, max_posts, cutoff_date, cursor, full_scan_interval, cancelled):
+        """
+        Walks one source profile. Stops at the cursor's newest_date (the newest post seen on a
+        previous fetch) unless a full re-scan is due, or early once cancelled is set.
+        """
+        now = datetime.utcnow()
+        cursor = dict(cursor or {})
+        mark_date = cursor.get("newest_date")
+        last_full_scan = cursor.get("last_full_scan")
+        full_scan = mark_date is None or last_full_scan is None or now - last_full_scan >= full_scan_interval
+
+        reels = []
+        newest = None
+        profile = instaloader.Profile.from_username(self._get_loader().context, username)
+        for post in profile.get_posts():
+            if len(reels) >= max_posts or cancelled.is_set():
+                break
+            pinned = getattr(post, 'is_pinned', False)
+            if not pinned:
+                # Posts arrive newest first (apart from pinned ones), so older posts can end the walk
+                if not full_scan and post.date_utc <= mark_date:
+                    break
+                if post.date <= cutoff_date:
+                    break
+                if newest is None:
+                    newest = post
+            if post.is_video and post.date > cutoff_date:
+                reels.append(post)
+
+        if newest is not None and (mark_date is None or newest.date_utc > mark_date):
+            cursor["newest_shortcode"] = newest.shortcode
+            cursor["newest_date"] = newest.date_utc
+        if full_scan:
+            cursor["last_full_scan"] = now
+        logging.info(f"@{username}: {len(reels)} reels ({'full' if full_scan else 'incremental'} scan).")
+        return reels, cursor
 
 class Instagram:
-    def __init__(self, username, password, proxy=None):
+    def __init__(self, username, password, proxy=None, validate=True):
         """
         Initializes the Instagram clients.
+        A saved session is loaded from disk without a network call; with validate=True the
+        session is checked (or created by logging in) straight away, as ensure_session does.
         """
         self.username = username
         self.password = password
-        self.L = instaloader.Instaloader(user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+        self.proxy = proxy
+        self.session_file = f'session_{self.username}.json'
+        self.limiter = get_rate_limiter()
+        self.breakers = get_circuit_breakers()
+        self.L = new_loader(self.limiter)
         self.cl = Client()
+        self.healthy = False
+        self.last_validated = None
+        self.last_error = None
+        self.failures = 0
         if proxy:
             # Assuming proxy is http://user:pass@ip:port or socks5://
             if proxy.startswith("http"):
@@ -26,87 +243,192 @@ class Instagram:
                 # If not http, assume socks5://user:pass@ip:port
                 proxy_dict = {"socks5": f"socks5://{proxy}"}
             self.cl.set_proxy(proxy_dict)
-            logging.info(f"Set proxy for {username}: {proxy_dict}")
-        session_file = f'session_{self.username}.json'
-        if os.path.exists(session_file):
+            logging.info(f"Set proxy for {username}: {proxy_label(proxy)}")
+        if os.path.exists(self.session_file):
+            try:
+                self.cl.load_settings(self.session_file)
+                # Trust the session as of when it was last written
+                self.last_validated = datetime.utcfromtimestamp(os.path.getmtime(self.session_file))
+                self.healthy = True
+            except Exception as e:
+                logging.error(f"Could not load session file for {self.username}: {e}")
+        if validate:
+            self.ensure_session(timedelta(0))
+
+    def needs_validation(self, ttl):
+        """
+        Returns True if the session is unhealthy or was last validated more than ttl ago.
+        """
+        return not self.healthy or self.last_validated is None or datetime.utcnow() - self.last_validated >= ttl
+
+    @timed("ensure_session", account_labels, none_is_failure=False)
+    def ensure_session(self, ttl):
+        """
+        Blocking. Validates the session if it is older than ttl, logging in again if it is invalid or missing.
+        Errors that say nothing about the session (network trouble, throttling) are raised instead,
+        since logging in again wouldn't help.
+        """
+        if not self.needs_validation(ttl):
+            return
+        if self.healthy:
             try:
-                self.cl.load_settings(session_file)
-                # Verify session is valid
                 logging.info(f"Attempting to verify session for {self.username}")
-                user_info = self.cl.user_info(self.username)
-                logging.info(f"Session verification successful for {self.username}: {user_info}")
-                print("Session loaded successfully.")
+                retrying("read", is_async=False)(self._call, "read", self.cl.account_info)
+                self.last_validated = datetime.utcnow()
+                self.failures = 0
+                logging.info(f"Session verification successful for {self.username}")
+                return
             except Exception as e:
+                if classify(e) != AUTH:
+                    logging.error(f"Could not verify session for {self.username}: {e}")
+                    raise
                 logging.error(f"Session invalid for {self.username}: {e}")
                 logging.error(f"Session exception type: {type(e).__name__}")
-                print(f"Session invalid ({e}), logging in...")
-                logging.info(f"Attempting login after invalid session for {self.username}")
-                try:
-                    self.cl.login(self.username, self.password)
-                    self.cl.dump_settings(session_file)
-                    print("Login successful and session saved.")
-                except Exception as login_e:
-                    logging.error(f"Login failed for {self.username}: {login_e}")
-                    logging.error(f"Login exception type: {type(login_e).__name__}")
-                    print(f"Login failed: {login_e}")
-                    raise
-        else:
-            print("No session file found, logging in...")
-            logging.info(f"Attempting fresh login for {self.username}")
-            try:
-                self.cl.login(self.username, self.password)
-                self.cl.dump_settings(session_file)
-                print("Login successful and session saved.")
-            except Exception as e:
-                logging.error(f"Login failed for {self.username}: {e}")
-                logging.error(f"Exception type: {type(e).__name__}")
-                print(f"Login failed: {e}")
-                raise
+        self.login()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def get_reels(self, usernames, max_posts=10, days_cutoff=7):
+    @timed("login", account_labels, none_is_failure=False)
+    def login(self):
         """
-        Asynchronously fetches public reels from a list of usernames with retries and rate limiting.
+        Blocking. Logs in with the account password and saves the session.
         """
-        all_reels = []
-        cutoff_date = datetime.now() - timedelta(days=days_cutoff)
-        for username in usernames:
-            try:
-                logging.info(f"Fetching reels from @{username}...")
-                profile = instaloader.Profile.from_username(self.L.context, username)
-                count = 0
-                for post in profile.get_posts():
-                    if count >= max_posts:
-                        break
-                    if post.is_video and post.date > cutoff_date:
-                        all_reels.append(post)
-                        count += 1
-                    await asyncio.sleep(0.1)  # Small delay to avoid overwhelming
-                logging.info(f"Found {len(all_reels)} total reels so far.")
-                await asyncio.sleep(10)  # Delay to avoid rate limiting
-            except instaloader.ProfileNotExistsException:
-                logging.warning(f"Profile @{username} does not exist.")
-            except Exception as e:
-                logging.error(f"An error occurred while fetching from @{username}: {e}")
-                await asyncio.sleep(10)  # Delay even on error
-        return all_reels
+        logging.info(f"Attempting login for {self.username}")
+        try:
+            self._call("login", self.cl.login, self.username, self.password)
+            self.dump_session()
+            self.healthy = True
+            self.last_validated = datetime.utcnow()
+            self.last_error = None
+            self.failures = 0
+            logging.info(f"Login successful and session saved for {self.username}")
+        except Exception as e:
+            self.healthy = False
+            self.last_error = str(e)
+            self.failures += 1
+            logging.error(f"Login failed for {self.username}: {e}")
+            logging.error(f"Exception type: {type(e).__name__}")
+            raise
+
+    def dump_session(self):
+        """
+        Writes the session file atomically so a crash never leaves a truncated session behind.
+        """
+        tmp_file = f'{self.session_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            self.cl.dump_settings(tmp_file)
+            os.replace(tmp_file, self.session_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def mark_auth_error(self, error):
+        """
+        Records that Instagram rejected the session, so it is re-logged in before its next use.
+        """
+        self.healthy = False
+        self.last_validated = None
+        self.last_error = str(error)
+        self.failures += 1
+        logging.error(f"Session for {self.username} was rejected: {error}")
+
+    def _check_auth_error(self, error):
+        if classify(error) == AUTH:
+            self.mark_auth_error(error)
+
+    def proxy_breaker(self, proxy=False):
+        """
+        Returns the circuit breaker of the account's proxy (or the given one), or None without a proxy.
+        """
+        proxy = self.proxy if proxy is False else proxy
+        return self.breakers.get("proxy", proxy_label(proxy)) if proxy else None
+
+    def _check_breaker(self, breaker):
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"Proxy {proxy_label(self.proxy)} is failing, not calling through it for now")
+
+    def _record_outcome(self, breaker, endpoint, proxy, account, error=None):
+        """
+        Reports a call's outcome: throttling to the rate limiter, and to the proxy's circuit
+        breaker whether the proxy itself worked. Only transient (network) errors count against it.
+        """
+        kind = classify(error) if error is not None else None
+        if kind == RATE_LIMITED:
+            self.limiter.throttled(proxy, endpoint, account)
+        if breaker is not None and not isinstance(error, CircuitOpenError):
+            if kind == TRANSIENT:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+    def _call(self, endpoint, fn, *args, **kwargs):
+        """
+        Blocking. Calls an instagrapi method for this account once the rate limiter and its
+        proxy's circuit breaker allow, reporting the outcome back to both.
+        """
+        breaker = self.proxy_breaker()
+        self._check_breaker(breaker)
+        self.limiter.wait(self.proxy, endpoint, self.username)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record_outcome(breaker, endpoint, self.proxy, self.username, e)
+            raise
+        self._record_outcome(breaker, endpoint, self.proxy, self.username)
+        return result
+
+    async def _call_async(self, endpoint, fn, *args, proxy=False, account=True, **kwargs):
+        """
+        Runs a blocking Instagram call on a thread once the rate limiter and circuit breaker allow.
+        By default the call is keyed on this account and its proxy; anonymous instaloader calls pass
+        proxy=None, account=False since they don't go through either.
+        """
+        proxy = self.proxy if proxy is False else proxy
+        account = self.username if account else None
+        breaker = self.proxy_breaker(proxy)
+        self._check_breaker(breaker)
+        await self.limiter.wait_async(proxy, endpoint, account)
+        try:
+            result = await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception as e:
+            self._record_outcome(breaker, endpoint, proxy, account, e)
+            raise
+        self._record_outcome(breaker, endpoint, proxy, account)
+        return result
+
+    async def _attempt(self, endpoint, fn, *args, **kwargs):
+        """
+        _call_async with the endpoint's retry policy, so only this one call is retried.
+        """
+        return await retrying(endpoint)(self._call_async, endpoint, fn, *args, **kwargs)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def download_reel(self, post):
+    @timed("get_reels", account_labels)
+    async def get_reels(self, usernames, max_posts=10, days_cutoff=7, cursors=None, full_scan_interval=timedelta(hours=24)):
         """
-        Asynchronously downloads a single reel and its thumbnail with retries.
+        Asynchronously fetches public reels from a list of usernames with rate limiting; each
+        source is retried on its own. See SourceFetcher.fetch_sources for how cursors are used.
+        """
+        fetcher = SourceFetcher(self.L)
+        try:
+            reels_by_source = await fetcher.fetch_sources(usernames, max_posts, days_cutoff, cursors, full_scan_interval)
+        finally:
+            fetcher.close()
+        return [post for reels in reels_by_source.values() for post in reels]
+
+    @timed("download_reel", account_labels)
+    async def download_reel(self, post, target_dir='temp_reels'):
+        """
+        Asynchronously downloads a single reel and its thumbnail into target_dir with retries.
         Returns the paths to the video file and thumbnail.
         """
         try:
             logging.info(f"Downloading reel from @{post.owner_username} (shortcode: {post.shortcode})...")
-            await asyncio.to_thread(self.L.download_post, post, target='temp_reels')
+            await self._attempt("download", self.L.download_post, post, target=target_dir, proxy=None, account=False)
             video_path = None
             thumbnail_path = None
-            for f in await asyncio.to_thread(os.listdir, 'temp_reels'):
+            for f in await asyncio.to_thread(os.listdir, target_dir):
                 if f.endswith('.mp4'):
-                    video_path = os.path.join('temp_reels', f)
+                    video_path = os.path.join(target_dir, f)
                 elif f.endswith('.jpg'):
-                    thumbnail_path = os.path.join('temp_reels', f)
+                    thumbnail_path = os.path.join(target_dir, f)
             if not video_path:
                 logging.error("Error: .mp4 file not found after download.")
                 return None, None
@@ -116,38 +438,70 @@ class Instagram:
             logging.error(f"Error downloading reel: {e}")
             return None, None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    @timed("upload_reel", account_labels)
     async def upload_reel(self, video_path, caption, thumbnail_path=None):
         """
-        Asynchronously uploads a reel to the logged-in account with retries.
+        Asynchronously uploads a reel to the logged-in account. Only uploads Instagram refused
+        for rate limiting are retried; see errors.RETRY_POLICIES.
         """
         try:
             logging.info("Uploading reel...")
-            media = await asyncio.to_thread(self.cl.video_upload, video_path, caption=caption, thumbnail=thumbnail_path)
+            media = await self._attempt("upload", self.cl.video_upload, video_path, caption=caption, thumbnail=thumbnail_path)
             logging.info("Upload successful!")
             return media
         except Exception as e:
             logging.error(f"Error uploading reel: {e}")
+            self._check_auth_error(e)
             return None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    @timed("find_uploaded_reel", account_labels, none_is_failure=False)
+    async def find_uploaded_reel(self, caption, since, amount=10):
+        """
+        Looks through the account's latest media for a reel with this caption taken after since
+        (naive UTC), to tell whether an interrupted upload went through. Returns the media or None.
+        Errors are raised: if Instagram can't be asked, the upload must not be repeated.
+        """
+        medias = await self._attempt("read", self.cl.user_medias, self.cl.user_id, amount)
+        since = since.replace(tzinfo=timezone.utc) - timedelta(minutes=5)
+        for media in medias:
+            taken_at = getattr(media, 'taken_at', None)
+            if taken_at is not None and taken_at.tzinfo is None:
+                taken_at = taken_at.replace(tzinfo=timezone.utc)
+            if (getattr(media, 'caption_text', None) or "") == (caption or "") and taken_at is not None and taken_at >= since:
+                return media
+        return None
+
+    @timed("get_post_by_shortcode", account_labels)
     async def get_post_by_shortcode(self, shortcode):
         """
         Asynchronously fetches a post by its shortcode with retries.
         """
         try:
-            return await asyncio.to_thread(instaloader.Post.from_shortcode, self.L.context, shortcode)
+            return await retrying("scrape")(asyncio.to_thread, instaloader.Post.from_shortcode, self.L.context, shortcode)
         except Exception as e:
             logging.error(f"Error getting post {shortcode}: {e}")
             return None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    async def get_post_from_cache(self, doc):
+        """
+        Rebuilds the post from the node cached on an available_reels doc, without a request.
+        Falls back to a live fetch by shortcode when the cached media URLs have expired.
+        Returns (post, from_cache).
+        """
+        if not cached_media_expired(doc):
+            try:
+                return instaloader.Post(self.L.context, doc["node"]), True
+            except Exception as e:
+                logging.warning(f"Cached node for {doc['shortcode']} is unusable: {e}")
+        return await self.get_post_by_shortcode(doc["shortcode"]), False
+
+    @timed("get_reel_analytics", account_labels)
     async def get_reel_analytics(self, media_id):
         """
         Fetches analytics for a posted reel.
         """
         try:
-            media_info = await asyncio.to_thread(self.cl.media_info, media_id)
+            media_info = await self._attempt("read", self.cl.media_info, media_id)
             analytics = {
                 "views": getattr(media_info, 'view_count', 0),
                 "likes": getattr(media_info, 'like_count', 0),
@@ -158,4 +512,5 @@ class Instagram:
             return analytics
         except Exception as e:
             logging.error(f"Error fetching analytics for media {media_id}: {e}")
+            self._check_auth_error(e)
             return None
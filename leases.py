@@ -0,0 +1,83 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from datetime import timedelta
+
+# Identifies this process in account leases and queue claims
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+class AccountLease:
+    def __init__(self, db, account_username, holder=None, ttl=None):
+        """
+        A worker's exclusive claim on one account in account_status, so several worker
+        processes can share a fleet without posting twice for the same account.
+        While held, the lease is renewed in the background every third of its ttl; check
+        is_valid before doing anything that must not happen twice.
+        """
+        self.db = db
+        self.account_username = account_username
+        self.holder = holder or WORKER_ID
+        self.ttl = ttl or timedelta(minutes=float(os.getenv('ACCOUNT_LEASE_MINUTES', 15)))
+        self.held = False
+        self.lost = False
+        self._confirmed_at = None
+        self._heartbeat = None
+
+    async def acquire(self, last_post_time=None, check_last_post_time=True):
+        """
+        Tries to claim the account; see Database.acquire_account_lease. Returns True on success.
+        """
+        # Timed from before the write, so the lease is never thought to last longer than it does
+        requested_at = time.monotonic()
+        self.held = await asyncio.to_thread(
+            self.db.acquire_account_lease, self.account_username, self.holder, self.ttl,
+            last_post_time, check_last_post_time
+        )
+        if self.held:
+            self.lost = False
+            self._confirmed_at = requested_at
+            self._heartbeat = asyncio.create_task(self._renew())
+        return self.held
+
+    def is_valid(self):
+        """
+        Returns True while the lease is held and was last confirmed less than half its ttl ago,
+        so it can't expire under a step that starts now (such as an upload) before the next renewal.
+        """
+        return (self.held and not self.lost and self._confirmed_at is not None
+                and time.monotonic() - self._confirmed_at < self.ttl.total_seconds() / 2)
+
+    async def release(self, last_post_time=None, jitter_seconds=None, retry_at=None):
+        """
+        Stops renewing and releases the lease, recording last_post_time with it, or
+        retry_at for the next attempt after a failed one.
+        """
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if not self.held:
+            return
+        self.held = False
+        released = await asyncio.to_thread(
+            self.db.release_account_lease, self.account_username, self.holder, last_post_time, jitter_seconds, retry_at
+        )
+        if not released:
+            logging.warning(f"Lease on {self.account_username} had expired before it was released.")
+            if last_post_time is not None:
+                # Still record the post so the account isn't considered due again
+                await asyncio.to_thread(self.db.update_last_post_time, self.account_username, last_post_time, jitter_seconds)
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl.total_seconds() / 3)
+            try:
+                requested_at = time.monotonic()
+                if not await asyncio.to_thread(self.db.renew_account_lease, self.account_username, self.holder, self.ttl):
+                    logging.warning(f"Lost the lease on {self.account_username} to another worker.")
+                    self.lost = True
+                    return
+                self._confirmed_at = requested_at
+            except Exception as e:
+                logging.error(f"Error renewing lease on {self.account_username}: {e}")
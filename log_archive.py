@@ -0,0 +1,58 @@
+import os
+import gzip
+import json
+import uuid
+import logging
+from datetime import datetime, timedelta
+
+class LogArchiver:
+    def __init__(self, directory=None):
+        """
+        Exports activity logs to one gzip-compressed JSON Lines file per UTC day
+        (<directory>/logs-YYYY-MM-DD.jsonl.gz) before the TTL index removes them.
+        Each finished day is exported once and recorded in the log_archives collection.
+        """
+        self.directory = directory if directory is not None else os.getenv('LOG_ARCHIVE_DIR', 'log_archive')
+
+    def archive(self, db):
+        """
+        Exports every finished day that isn't archived yet, oldest first. Blocking; returns
+        the number of days exported.
+        """
+        if not self.directory:
+            return 0
+        oldest = db.get_oldest_log_time()
+        if oldest is None:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        archived = db.get_archived_log_days()
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        day = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+        exported = 0
+        while day < today:
+            if day not in archived:
+                path, count = self._export_day(db, day)
+                db.record_log_archive(day, path, count)
+                if count:
+                    logging.info(f"Archived {count} logs of {day:%Y-%m-%d} to {path}.")
+                exported += 1
+            day += timedelta(days=1)
+        return exported
+
+    def _export_day(self, db, day):
+        path = os.path.join(self.directory, f'logs-{day:%Y-%m-%d}.jsonl.gz')
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        count = 0
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for doc in db.get_logs_between(day, day + timedelta(days=1)):
+                    f.write(json.dumps(doc, default=str) + '\n')
+                    count += 1
+            if not count:
+                return None, 0
+            # Only complete files ever appear under the final name
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path, count
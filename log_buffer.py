@@ -0,0 +1,122 @@
+import queue
+import atexit
+import logging
+import threading
+
+class ActivityLogBuffer:
+    def __init__(self, collection, max_size=10000, batch_size=100, flush_interval=2.0, policy='drop', block_timeout=1.0,
+                 on_flush=None):
+        """
+        Buffers activity log documents and writes them to a collection in batches from a background thread.
+        policy is 'drop' (discard new entries when full) or 'block' (wait up to block_timeout for room).
+        on_flush, if given, is called with each batch after it has been written.
+        """
+        self.collection = collection
+        self.on_flush = on_flush
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max(max_size, 1))
+        self._counter_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def put(self, doc):
+        """
+        Enqueues a log document without waiting on the database.
+        Returns False if the entry was dropped because the buffer is full or closed.
+        """
+        if self._stop.is_set():
+            self._count('dropped')
+            return False
+        self._ensure_thread()
+        try:
+            if self.policy == 'block':
+                self._queue.put(doc, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(doc)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """
+        Writes everything currently buffered with insert_many, one batch at a time.
+        """
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                try:
+                    self.collection.insert_many(batch, ordered=False)
+                    self._count('flushed', len(batch))
+                except Exception as e:
+                    self._count('failed', len(batch))
+                    logging.error(f"Error flushing {len(batch)} activity logs: {e}")
+                    continue
+                if self.on_flush is not None:
+                    try:
+                        self.on_flush(batch)
+                    except Exception as e:
+                        logging.error(f"Error in activity log flush callback: {e}")
+
+    def close(self):
+        """
+        Stops the flusher and drains the buffer. Safe to call more than once.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=30)
+        self.flush()
+
+    def stats(self):
+        """
+        Returns the buffer counters.
+        """
+        with self._counter_lock:
+            return {
+                "buffered": self._queue.qsize(),
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-log-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
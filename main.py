@@ -1,108 +1,298 @@
 import os
+import time
 import random
-import shutil
 import asyncio
 import logging
 import threading
 import configparser
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from database import Database
-from instagram import Instagram
+from types import SimpleNamespace
+from database import get_database, close_clients, JOB_STAGES
+from instagram import SourceFetcher
+from client_pool import InstagramClientPool
+from media_cache import MediaCache
+from prefetch import Prefetcher
+from analytics_refresher import AnalyticsRefresher
+from log_archive import LogArchiver
+from rate_limit import get_rate_limiter
+from circuit_breaker import get_circuit_breakers
+import metrics
+from scheduler import DeadlineScheduler
+from queue_executor import QueueExecutor
+from leases import AccountLease, WORKER_ID
 from app import app
 
-async def process_account(username, password, source_accounts, proxy, db_conn_str, db_name, max_posts, days_cutoff):
+# Instagram clients live across scheduler cycles
+client_pool = InstagramClientPool()
+
+# Downloaded reels are shared between accounts and kept across cycles
+media_cache = MediaCache()
+
+# Downloads the next reels for accounts that are about to be due
+prefetcher = Prefetcher(client_pool, media_cache)
+
+# Re-polls post analytics, often while posts are fresh and rarely once they age
+analytics_refresher = AnalyticsRefresher(client_pool, lambda username: account_lock(username))
+
+# Next due time of every account, maintained by run_scheduler
+deadlines = DeadlineScheduler()
+
+# Posts queued items as they come up; created by main_entry
+queue_executor = None
+
+# Concurrency caps shared by scheduled and queued posts
+_global_limit = None
+_proxy_limits = {}
+_account_locks = {}
+
+def account_lock(username):
+    """
+    Returns the lock held while anything posts for, or polls through, an account.
     """
-    Asynchronously processes a single Instagram account.
+    return _account_locks.setdefault(username, asyncio.Lock())
+
+def account_slot(username, proxy):
+    """
+    Returns the semaphores/locks a post must hold: the global cap, its proxy's cap and a
+    per-account lock, so scheduled and queued posts never run for one account at once.
+    """
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(max(int(os.getenv('MAX_CONCURRENT_ACCOUNTS', 5)), 1))
+    proxy_limit = _proxy_limits.setdefault(proxy, asyncio.Semaphore(max(int(os.getenv('MAX_CONCURRENT_PER_PROXY', 1)), 1)))
+    return account_lock(username), _global_limit, proxy_limit
+
+async def process_account(username, password, proxy, db_conn_str, db_name, shortcode=None, lease=None):
     """
-    db = Database(db_conn_str, db_name)
+    Asynchronously processes a single Instagram account, posting one of its available reels,
+    or the given shortcode (e.g. from the queue). Source accounts are fetched beforehand by fetch_sources.
+    An unfinished post job of the account (for that shortcode, if given) is resumed first.
+    With lease, nothing is uploaded once the account's lease is no longer valid.
+    Returns a short status string describing the outcome.
+    """
+    db = get_database(db_conn_str, db_name)
     db.log_activity("INFO", f"Processing account: {username}", username, "process_start")
 
+    insta = None
+    job = None
     try:
-        # Initialize Instagram client
-        insta = Instagram(username, password, proxy)
-
-        # Fetch all reels from source accounts
-        all_reels = await insta.get_reels(source_accounts, max_posts, days_cutoff)
+        # Borrow the account's long-lived client; its session is revalidated lazily
+        with metrics.stage("session_setup", username, proxy):
+            insta = await client_pool.get(username, password, proxy)
+        if insta is None:
+            db.log_activity("WARNING", "Session is being re-established, skipping this slot.", username, "session_unavailable")
+            return "session_unavailable"
 
-        if not all_reels:
-            db.log_activity("WARNING", "No reels found from the source accounts.", username, "fetch_reels")
-            return
+        # Pick up where an interrupted or failed attempt stopped
+        job = db.get_open_post_job(username, shortcode)
+        if job:
+            db.log_activity("INFO", f"Resuming post job for {job['shortcode']} after stage {job['stage']}.", username, "job_resume")
+            return await run_post_job(db, insta, username, job, lease)
 
-        # Save fetched reels to database
-        db.add_available_reels(username, all_reels)
+        if shortcode:
+            if db.is_posted(username, shortcode):
+                db.log_activity("WARNING", f"Reel {shortcode} was already posted.", username, "already_posted")
+                return "already_posted"
+            job = db.start_post_job(username, db.get_available_reel(username, shortcode) or {"shortcode": shortcode}, WORKER_ID)
+            return await run_post_job(db, insta, username, job, lease)
 
         # Get available reels not posted from database
         db.log_activity("INFO", "Getting available reels not posted...", username, "get_available")
-        available_docs = db.get_available_not_posted(username)
+        available_count = db.count_available_not_posted(username)
 
-        if not available_docs:
+        if not available_count:
             db.log_activity("INFO", "No new reels available to post.", username, "no_available")
-            return
+            return "no_available"
 
-        db.log_activity("INFO", f"Found {len(available_docs)} available reels to choose from.", username, "available_count")
+        db.log_activity("INFO", f"Found {available_count} available reels to choose from.", username, "available_count")
 
-        # Select a random reel doc
-        random_doc = random.choice(available_docs)
-        shortcode = random_doc["shortcode"]
-
-        # Fetch the post by shortcode
-        random_reel = await insta.get_post_by_shortcode(shortcode)
-        if not random_reel:
-            db.log_activity("ERROR", "Failed to fetch the selected reel.", username, "fetch_reel")
-            return
-
-        # Create a temporary directory for downloads
-        if not os.path.exists('temp_reels'):
-            os.makedirs('temp_reels')
-
-        # Download the reel
-        video_path, thumbnail_path = await insta.download_reel(random_reel)
-
-        if video_path:
-            # Create a caption
-            caption = random_reel.caption
-
-            # Upload the reel
-            upload_result = await insta.upload_reel(video_path, caption, thumbnail_path)
-            if upload_result:
-                # Add to database if upload was successful
-                db.add_posted_reel(username, random_reel)
-                db.log_activity("INFO", f"Successfully posted reel {random_reel.shortcode}", username, "post_success")
-                # Fetch analytics after posting
-                analytics = await insta.get_reel_analytics(upload_result.id)
-                if analytics:
-                    db.update_post_analytics(random_reel.shortcode, analytics)
-            else:
-                db.log_activity("ERROR", f"Failed to upload reel {random_reel.shortcode}", username, "post_failure")
+        # Use a reel prefetched ahead of this slot, otherwise select a random reel doc
+        random_doc = prefetcher.take(db, username) or db.get_random_available_not_posted(username)
+        if not random_doc:
+            db.log_activity("INFO", "No new reels available to post.", username, "no_available")
+            return "no_available"
 
-        # Clean up the temporary directory
-        if os.path.exists('temp_reels'):
-            shutil.rmtree('temp_reels')
-            db.log_activity("INFO", "Cleaned up temporary files.", username, "cleanup")
+        job = db.start_post_job(username, random_doc, WORKER_ID)
+        return await run_post_job(db, insta, username, job, lease)
 
     except Exception as e:
         db.log_activity("ERROR", f"An unexpected error occurred: {e}", username, "error")
-        # Clean up just in case
-        if os.path.exists('temp_reels'):
-            shutil.rmtree('temp_reels')
+        if job is not None and job.get("status") == "active":
+            db.fail_post_job(job, str(e), int(os.getenv('POST_JOB_MAX_ATTEMPTS', 3)))
+        return "error"
 
-async def check_and_post():
+    finally:
+        if insta is not None:
+            client_pool.release(insta)
+
+async def run_post_job(db, insta, username, job, lease=None):
     """
-    Check each account and post if 5 hours have passed since last post.
+    Runs a post job on from its last completed stage, recording a failed attempt so the job
+    is resumed (not restarted) next time. Returns a short status string describing the outcome.
     """
-    load_dotenv()
+    if job["status"] == "done":
+        db.log_activity("WARNING", f"Reel {job['shortcode']} was already posted.", username, "already_posted")
+        return "already_posted"
+    if job["status"] == "failed":
+        db.log_activity("WARNING", f"Reel {job['shortcode']} may have been uploaded by a failed job; not posting it again.",
+                        username, "job_failed")
+        # Jobs that failed before reels were flagged; keep the reel from being picked again
+        db.exclude_failed_reel(username, job["shortcode"])
+        return "job_failed"
+    result = await post_reel(db, insta, username, job, lease)
+    if result == "lease_lost":
+        # The job is left as it is for whichever worker holds the account now
+        return result
+    if result != "posted":
+        status = db.fail_post_job(job, result, int(os.getenv('POST_JOB_MAX_ATTEMPTS', 3)))
+        if status == "failed":
+            db.log_activity("ERROR", f"Giving up on reel {job['shortcode']} after {job['attempts']} attempts.", username, "job_failed")
+    return result
 
-    # Load environment variables
-    mongo_conn_str = os.getenv('MONGO_CONNECTION_STRING')
-    mongo_db_name = os.getenv('MONGO_DATABASE_NAME')
-    max_posts = int(os.getenv('MAX_POSTS_PER_ACCOUNT', 10))
-    days_cutoff = int(os.getenv('DAYS_CUTOFF', 7))
-    db = Database(mongo_conn_str, mongo_db_name)
+async def post_reel(db, insta, username, job, lease=None):
+    """
+    Moves a post job through its stages: selected -> downloaded -> uploaded -> recorded -> analytics.
+    Each stage is persisted once done, so a resumed job reuses the cached download and never
+    uploads twice: an upload that was started but not confirmed is looked up on the account first,
+    and no upload starts once the account's lease (if given) is no longer valid.
+    Returns a short status string describing the outcome.
+    """
+    doc = job["doc"]
+    if JOB_STAGES.index(job["stage"]) < JOB_STAGES.index("uploaded"):
+        # Rebuild the post from the node cached at discovery, or fetch it if the media URLs expired
+        reel, from_cache = await insta.get_post_from_cache(doc)
+        if not reel:
+            db.log_activity("ERROR", "Failed to fetch the selected reel.", username, "fetch_reel")
+            return "fetch_failed"
+        if not from_cache:
+            db.refresh_available_reel(username, reel)
+
+        # Download the reel through the shared media cache; each download is staged in its own directory
+        download = lambda target_dir: insta.download_reel(reel, target_dir)
+        async with media_cache.open(reel.shortcode, download) as (video_path, thumbnail_path):
+            if not video_path:
+                return "download_failed"
+            if job["stage"] == "selected" and not db.update_post_job(job, "downloaded", caption=reel.caption,
+                                                                     owner_username=reel.owner_username):
+                return "job_conflict"
+
+            media = None
+            if job.get("upload_started_at"):
+                # A previous attempt may have uploaded before it was interrupted
+                try:
+                    media = await insta.find_uploaded_reel(job["caption"], job["upload_started_at"])
+                except Exception as e:
+                    db.log_activity("ERROR", f"Could not check for an earlier upload of {reel.shortcode}: {e}", username, "upload_unknown")
+                    return "upload_unknown"
+                if media:
+                    db.log_activity("INFO", f"Found the earlier upload of {reel.shortcode}.", username, "upload_found")
+            if not media:
+                if lease is not None and not lease.is_valid():
+                    # Another worker may take over the account and resume this job
+                    db.log_activity("WARNING", f"Lost the account lease, not uploading {reel.shortcode}.", username, "lease_lost")
+                    return "lease_lost"
+                # Upload the reel straight from the cache
+                db.update_post_job(job, upload_started_at=datetime.utcnow())
+                media = await insta.upload_reel(video_path, job["caption"], thumbnail_path)
+            if not media:
+                db.log_activity("ERROR", f"Failed to upload reel {reel.shortcode}", username, "post_failure")
+                return "upload_failed"
+            db.update_post_job(job, "uploaded", media_id=str(media.id))
 
-    # Load accounts from config.ini
+    if job["stage"] == "uploaded":
+        # Add to database; a post recorded just before an interruption isn't recorded twice
+        if not db.is_posted(username, job["shortcode"]):
+            reel_data = SimpleNamespace(shortcode=job["shortcode"], caption=job["caption"], owner_username=job["owner_username"])
+            db.add_posted_reel(username, reel_data, media_id=job["media_id"])
+        db.update_post_job(job, "recorded")
+        db.log_activity("INFO", f"Successfully posted reel {job['shortcode']}", username, "post_success")
+
+    if job["stage"] == "recorded":
+        # Analytics are polled later by the refresher, once there is something to count
+        db.schedule_analytics_refresh(username, job["shortcode"], datetime.utcnow() + analytics_refresher.min_interval)
+        db.update_post_job(job, "analytics")
+
+    return "posted"
+
+async def fetch_sources(db, accounts, due_accounts, max_posts, days_cutoff):
+    """
+    Fetches every distinct source of the due accounts once and fans the new reels out to
+    all configured accounts that subscribe to each source.
+    """
+    subscribers = {}
+    for username, _, source_accounts, _ in accounts:
+        for source in source_accounts:
+            subscribers.setdefault(source, []).append(username)
+    sources = list(dict.fromkeys(source for _, _, source_accounts, _ in due_accounts for source in source_accounts))
+    if not sources:
+        return
+
+    # Resume from each source's high-water mark, saving reels as each source finishes
+    cursors = db.get_source_cursors(sources)
+    full_scan_interval = timedelta(hours=float(os.getenv('SOURCE_FULL_SCAN_HOURS', 24)))
+    fetcher = SourceFetcher()
+    total = 0
+    # A source's mark only moves once its reels are stored, so a failed write is fetched again
+    stored = {}
+    try:
+        async for source, reels in fetcher.iter_sources(sources, max_posts, days_cutoff, cursors, full_scan_interval):
+            if db.add_available_reels_for_subscribers({source: subscribers.get(source, [])}, {source: reels}):
+                stored[source] = cursors.get(source)
+                total += len(reels)
+    finally:
+        fetcher.close()
+        db.update_source_cursors(stored)
+    db.log_activity("INFO", f"Fetched {total} new reels from {len(sources)} source accounts.", None, "fetch_reels")
+
+async def run_account(account, db, mongo_conn_str, mongo_db_name, interval, jitter=timedelta(0)):
+    """
+    Runs process_account for one due account under the global and per-proxy concurrency caps
+    and an account lease, so only one worker process posts for the account.
+    After a post, a random delay of up to jitter is recorded for the account's next slot; any other
+    outcome keeps the slot and retries it after POST_RETRY_MINUTES.
+    Returns (username, result, duration in seconds).
+    """
+    username, password, _, proxy = account
+    if proxy and get_circuit_breakers().get("proxy", metrics.proxy_label(proxy)).is_open():
+        # Don't spend the slot on calls that would be refused; the account is retried later
+        logging.info(f"Skipping account {username}: its proxy is failing")
+        return username, "proxy_unavailable", 0.0
+    account_lock, limits, proxy_limit = account_slot(username, proxy)
+    async with account_lock, limits, proxy_limit:
+        # Re-check that the account is due now that a slot is free, then claim it on that basis
+        status = db.get_account_statuses([username]).get(username)
+        now = datetime.now(timezone.utc)
+        if due_time(status, interval, now) > now:
+            return username, "not_due", 0.0
+        lease = AccountLease(db, username)
+        if not await lease.acquire((status or {}).get("last_post_time")):
+            logging.info(f"Account {username} is being handled by another worker")
+            return username, "leased_elsewhere", 0.0
+
+        logging.info(f"Posting for account {username}")
+        start = time.monotonic()
+        result = "error"
+        try:
+            result = await process_account(username, password, proxy, mongo_conn_str, mongo_db_name, lease=lease)
+        except Exception as e:
+            logging.error(f"Account {username} failed: {e}")
+        finally:
+            duration = time.monotonic() - start
+            now = datetime.now(timezone.utc)
+            if result == "posted":
+                await lease.release(now, random.uniform(0, jitter.total_seconds()))
+            else:
+                await lease.release(retry_at=now + timedelta(minutes=float(os.getenv('POST_RETRY_MINUTES', 30))))
+    return username, result, duration
+
+def load_accounts(path='config.ini'):
+    """
+    Loads (username, password, source_accounts, proxy) tuples from the Instagram_* sections of config.ini.
+    """
     config = configparser.ConfigParser()
-    config.read('config.ini')
+    config.read(path)
     accounts = []
     for section in config.sections():
         if section.startswith('Instagram_'):
@@ -113,22 +303,316 @@ async def check_and_post():
             if username and password and source_accounts:
                 source_accounts = [acc.strip() for acc in source_accounts.split(',')]
                 accounts.append((username, password, source_accounts, proxy))
+    return accounts
+
+def load_post_settings(path='config.ini'):
+    """
+    Loads each account's post interval and jitter from config.ini.
+    Sections may set post_interval_hours and post_jitter_minutes; otherwise the
+    POST_INTERVAL_HOURS and POST_JITTER_MINUTES defaults apply.
+    Returns a dict of username to (interval, jitter) timedeltas.
+    """
+    default_interval = float(os.getenv('POST_INTERVAL_HOURS', 5))
+    default_jitter = float(os.getenv('POST_JITTER_MINUTES', 0))
+    config = configparser.ConfigParser()
+    config.read(path)
+    settings = {}
+    for section in config.sections():
+        if section.startswith('Instagram_') and config[section].get('username'):
+            settings[config[section].get('username')] = (
+                timedelta(hours=config[section].getfloat('post_interval_hours', default_interval)),
+                timedelta(minutes=config[section].getfloat('post_jitter_minutes', default_jitter))
+            )
+    return settings
+
+def due_time(status, interval, now):
+    """
+    Computes when an account is next due from its account_status: last post time + interval
+    + the jitter drawn after that post, or later if a failed attempt set a retry time.
+    Accounts that never posted are due now.
+    """
+    last_post_time = (status or {}).get("last_post_time")
+    if last_post_time is None:
+        due = now
+    else:
+        due = last_post_time + interval + timedelta(seconds=status.get("jitter_seconds", 0))
+    # A failed attempt doesn't use up the slot, but is only retried after a delay
+    retry_at = (status or {}).get("retry_at")
+    return max(due, retry_at) if retry_at else due
+
+def interval_for(username, settings):
+    """
+    Returns an account's post interval, falling back to POST_INTERVAL_HOURS.
+    """
+    return settings.get(username, (timedelta(hours=float(os.getenv('POST_INTERVAL_HOURS', 5))), None))[0]
+
+def due_times_for(db, usernames, settings, now=None):
+    """
+    Computes when each account is next due, in one query. Accounts that never posted are
+    due at now, so callers comparing against their own clock should pass it in.
+    """
+    now = now or datetime.now(timezone.utc)
+    statuses = db.get_account_statuses(usernames)
+    return {username: due_time(statuses.get(username), interval_for(username, settings), now) for username in usernames}
+
+async def process_due(db, accounts, due_accounts, settings):
+    """
+    Fetches sources for the due accounts, then processes them concurrently and reports the results.
+    """
+    mongo_conn_str = os.getenv('MONGO_CONNECTION_STRING')
+    mongo_db_name = os.getenv('MONGO_DATABASE_NAME')
+    max_posts = int(os.getenv('MAX_POSTS_PER_ACCOUNT', 10))
+    days_cutoff = int(os.getenv('DAYS_CUTOFF', 7))
+
+    # Fetch each source once for the whole batch
+    await fetch_sources(db, accounts, due_accounts, max_posts, days_cutoff)
+
+    # Process due accounts concurrently; accounts without a proxy share the host's own IP
+    cycle_start = time.monotonic()
+    results = await asyncio.gather(*(
+        run_account(account, db, mongo_conn_str, mongo_db_name, interval_for(account[0], settings),
+                    settings.get(account[0], (None, timedelta(0)))[1])
+        for account in due_accounts
+    ))
+    report_cycle(db, results, time.monotonic() - cycle_start)
+    return results
 
+async def check_and_post():
+    """
+    Runs one polling cycle: posts for every account whose post interval has passed.
+    run_scheduler is the long-running, deadline-driven equivalent.
+    """
+    load_dotenv()
+
+    # Load environment variables
+    mongo_conn_str = os.getenv('MONGO_CONNECTION_STRING')
+    mongo_db_name = os.getenv('MONGO_DATABASE_NAME')
+    db = get_database(mongo_conn_str, mongo_db_name)
+
+    accounts = load_accounts()
     if not accounts:
         logging.error("No Instagram accounts configured in config.ini")
         return
-
-    from datetime import datetime, timedelta, timezone
+    settings = load_post_settings()
 
     # Check each account
-    for username, password, source_accounts, proxy in accounts:
-        last_post_time = db.get_last_post_time(username)
-        if last_post_time is None or (datetime.now(timezone.utc) - last_post_time) >= timedelta(hours=5):
-            logging.info(f"Posting for account {username}")
-            await process_account(username, password, source_accounts, proxy, mongo_conn_str, mongo_db_name, max_posts, days_cutoff)
-            db.update_last_post_time(username, datetime.now(timezone.utc))
+    now = datetime.now(timezone.utc)
+    due_times = due_times_for(db, [account[0] for account in accounts], settings, now)
+    due_accounts = []
+    for account in accounts:
+        if due_times[account[0]] <= now:
+            due_accounts.append(account)
         else:
-            logging.info(f"Account {username} not ready to post yet")
+            logging.info(f"Account {account[0]} not ready to post yet")
+
+    if not due_accounts:
+        return
+
+    await process_due(db, accounts, due_accounts, settings)
+
+def config_mtimes(paths=('config.ini', '.env')):
+    """
+    Returns the modification times of the config files, to notice edits cheaply.
+    """
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+async def run_scheduler():
+    """
+    Deadline-driven posting loop. Keeps every account's next due time in a priority queue,
+    sleeps until the earliest one, and reschedules an account as soon as its post finishes.
+    Config files are checked every CONFIG_POLL_SECONDS and a change re-plans all deadlines.
+    """
+    load_dotenv()
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    in_flight = set()
+    batches = set()
+    mtimes = None
+    accounts = {}
+    settings = {}
+
+    async def run_batch(batch):
+        results = []
+        failed = False
+        try:
+            results = await process_due(db, list(accounts.values()), batch, settings)
+        except Exception as e:
+            failed = True
+            logging.error(f"Batch of {len(batch)} accounts failed: {e}")
+        finally:
+            usernames = [account[0] for account in batch]
+            in_flight.difference_update(usernames)
+            now = datetime.now(timezone.utc)
+            # Accounts another worker is posting for get their new post time once it finishes;
+            # accounts behind a failing proxy are re-checked as well
+            retry_at = now + timedelta(seconds=float(os.getenv('LEASE_RETRY_SECONDS', 60)))
+            # A failed batch (e.g. MongoDB unreachable) backs off instead of re-running at once
+            failure_retry_at = now + timedelta(minutes=float(os.getenv('POST_RETRY_MINUTES', 30)))
+            leased_elsewhere = {username for username, result, _ in results
+                                if result in ("leased_elsewhere", "lease_lost", "proxy_unavailable")}
+            # Recompute from the post time (and jitter) just recorded
+            still_configured = [username for username in usernames if username in accounts]
+            try:
+                next_dues = due_times_for(db, still_configured, settings)
+            except Exception as e:
+                # Keep the accounts scheduled rather than dropping them until the config changes
+                logging.error(f"Error rescheduling {len(still_configured)} accounts: {e}")
+                next_dues = {username: failure_retry_at for username in still_configured}
+            for username, next_due in next_dues.items():
+                if failed:
+                    next_due = max(next_due, failure_retry_at)
+                elif username in leased_elsewhere:
+                    next_due = max(next_due, retry_at)
+                deadlines.schedule(username, next_due)
+
+    try:
+        while True:
+            if config_mtimes() != mtimes:
+                mtimes = config_mtimes()
+                load_dotenv(override=True)
+                accounts = {account[0]: account for account in load_accounts()}
+                settings = load_post_settings()
+                if not accounts:
+                    logging.error("No Instagram accounts configured in config.ini")
+                for username in deadlines.due_times():
+                    if username not in accounts:
+                        deadlines.remove(username)
+                idle = [username for username in accounts if username not in in_flight]
+                for username, due_time in due_times_for(db, idle, settings).items():
+                    deadlines.schedule(username, due_time)
+                logging.info(f"Scheduled {len(idle)} accounts from config.")
+
+            due = [accounts[username] for username in deadlines.pop_due() if username in accounts and username not in in_flight]
+            if due:
+                in_flight.update(account[0] for account in due)
+                task = asyncio.create_task(run_batch(due))
+                batches.add(task)
+                task.add_done_callback(batches.discard)
+
+            next_deadline = deadlines.next_deadline()
+            if next_deadline is not None:
+                logging.debug(f"Next account due at {next_deadline.isoformat()}")
+            await deadlines.wait(float(os.getenv('CONFIG_POLL_SECONDS', 30)))
+    finally:
+        for task in list(batches):
+            task.cancel()
+
+# Stage totals as of the previous cycle report, to summarise each cycle's share
+_last_stage_totals = {}
+
+def report_cycle(db, results, wall_time):
+    """
+    Logs per-account results and durations for a finished cycle, and stores a compact
+    summary with the stage timings and retries since the previous report.
+    """
+    global _last_stage_totals
+    for username, result, duration in results:
+        logging.info(f"Account {username}: {result} in {duration:.1f}s")
+        metrics.POST_RESULTS.inc(account=username, result=result)
+    posted = sum(1 for _, result, _ in results if result == "posted")
+    busy_time = sum(duration for _, _, duration in results)
+    summary = (f"Cycle finished in {wall_time:.1f}s: {posted}/{len(results)} accounts posted "
+               f"({busy_time:.1f}s of account time)")
+    logging.info(summary)
+    db.log_activity("INFO", summary, None, "cycle_summary")
+    cache = media_cache.stats()
+    logging.info(f"Media cache: {cache['hits']} hits, {cache['misses']} misses, "
+                 f"{cache['bytes_saved'] / 1024 / 1024:.1f} MB saved, {cache['bytes_used'] / 1024 / 1024:.1f} MB used")
+    limits = get_rate_limiter().stats()
+    throttled = {key: bucket for key, bucket in limits["buckets"].items() if bucket["throttles"]}
+    logging.info(f"Rate limits: {limits['waited_seconds']:.1f}s spent waiting, throttled buckets: {throttled or 'none'}")
+    circuits = get_circuit_breakers().stats()
+    if circuits:
+        logging.info(f"Circuit breakers not closed: {circuits}")
+    queue = queue_executor.stats() if queue_executor is not None else None
+    if queue:
+        logging.info(f"Queue: {queue['claimed']} claimed, {queue['done']} done, {queue['failed']} failed, "
+                     f"{queue['retried']} retried, {queue['in_progress']} in progress; "
+                     f"claim lag avg {queue['lag_seconds_avg']:.1f}s, max {queue['lag_seconds_max']:.1f}s")
+
+    totals = metrics.stage_totals()
+    stages = {}
+    for stage, (count, seconds) in totals.items():
+        last_count, last_seconds = _last_stage_totals.get(stage, (0, 0.0))
+        if count > last_count:
+            stages[stage] = {"count": count - last_count, "seconds": round(seconds - last_seconds, 3)}
+    _last_stage_totals = totals
+    results_by_kind = {}
+    for _, result, _ in results:
+        results_by_kind[result] = results_by_kind.get(result, 0) + 1
+    try:
+        db.record_cycle_metrics({
+            "wall_seconds": round(wall_time, 3),
+            "account_seconds": round(busy_time, 3),
+            "accounts": len(results),
+            "results": results_by_kind,
+            "stages": stages,
+            "rate_limit_wait_seconds": limits["waited_seconds"],
+            "queue": queue
+        })
+    except Exception as e:
+        logging.error(f"Error recording cycle metrics: {e}")
+
+async def post_queue_item(item):
+    """
+    Posts one claimed queue item for its account, sharing the scheduled posts' concurrency caps.
+    A successful post counts as the account's latest post and pushes back its next slot.
+    """
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    accounts = {account[0]: account for account in load_accounts()}
+    account = accounts.get(item["account_username"])
+    if account is None:
+        db.log_activity("ERROR", f"Queued reel {item['shortcode']} is for an account missing from config.ini.",
+                        item["account_username"], "queue_failure")
+        return "not_configured"
+    username, password, _, proxy = account
+    account_lock, limits, proxy_limit = account_slot(username, proxy)
+    async with account_lock, limits, proxy_limit:
+        # Queued posts aren't tied to the account being due, only to nobody else posting for it
+        lease = AccountLease(db, username)
+        if not await lease.acquire(check_last_post_time=False):
+            return "leased_elsewhere"
+        result = "error"
+        try:
+            result = await process_account(username, password, proxy, os.getenv('MONGO_CONNECTION_STRING'),
+                                           os.getenv('MONGO_DATABASE_NAME'), shortcode=item["shortcode"], lease=lease)
+        finally:
+            if result == "posted":
+                settings = load_post_settings()
+                jitter = settings.get(username, (None, timedelta(0)))[1]
+                await lease.release(datetime.now(timezone.utc), random.uniform(0, jitter.total_seconds()))
+                if username in deadlines.due_times():
+                    deadlines.schedule(username, due_times_for(db, [username], settings)[username])
+            else:
+                await lease.release()
+    return result
+
+async def prefetch_due():
+    """
+    Prefetches reels for accounts that will be due within the prefetch lookahead.
+    """
+    load_dotenv()
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    accounts = load_accounts()
+    await prefetcher.run(db, accounts, deadlines.due_times())
+
+async def refresh_analytics():
+    """
+    Re-polls the analytics of recently posted reels that are due a refresh.
+    """
+    load_dotenv()
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    await analytics_refresher.run(db, load_accounts())
+
+async def archive_logs():
+    """
+    Exports finished days of activity logs to compressed daily files.
+    """
+    load_dotenv()
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    try:
+        await asyncio.to_thread(LogArchiver().archive, db)
+    except Exception as e:
+        logging.error(f"Error archiving logs: {e}")
 
 def schedule_posts():
     """
@@ -146,24 +630,30 @@ def run_flask():
 
 async def main_entry():
     """
-    Main entry point to run initial check and start scheduler.
+    Main entry point: runs the deadline scheduler and the periodic background jobs.
     """
-    # Run initial check
-    await check_and_post()
-
-    # Start scheduler
+    global queue_executor
+    # Start background jobs
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(check_and_post, 'interval', minutes=30)
+    scheduler.add_job(prefetch_due, 'interval', minutes=float(os.getenv('PREFETCH_INTERVAL_MINUTES', 5)), max_instances=1)
+    # Daily, and once at startup to catch up on days missed while stopped
+    scheduler.add_job(archive_logs, 'interval', hours=24, next_run_time=datetime.now(), max_instances=1)
+    scheduler.add_job(refresh_analytics, 'interval', minutes=float(os.getenv('ANALYTICS_REFRESH_INTERVAL_MINUTES', 10)), max_instances=1)
     scheduler.start()
 
-    # Keep the event loop running
+    # Post as accounts fall due and as queued items come up; runs until cancelled
+    load_dotenv()
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('MONGO_DATABASE_NAME'))
+    queue_executor = QueueExecutor(db, post_queue_item)
     try:
-        while True:
-            await asyncio.sleep(1)
+        await asyncio.gather(run_scheduler(), queue_executor.run())
     except KeyboardInterrupt:
         logging.info("Shutting down scheduler...")
         scheduler.shutdown()
         logging.info("Scheduler shut down.")
+    finally:
+        await client_pool.close()
+        close_clients()
 
 if __name__ == "__main__":
     # Start Flask app in a separate thread
@@ -0,0 +1,234 @@
+import os
+import json
+import uuid
+import shutil
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+
+class MediaCache:
+    def __init__(self, root=None, max_bytes=None):
+        """
+        Disk cache of downloaded reels, keyed by shortcode and stored by content hash.
+        Layout: objects/<sha256><ext> holds the files, refs/<shortcode>.json maps a shortcode
+        to its objects, and staging/ holds in-flight downloads. Least recently used entries
+        are evicted once the cache grows past max_bytes; entries in use are never evicted.
+        """
+        self.root = root or os.getenv('MEDIA_CACHE_DIR', 'media_cache')
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('MEDIA_CACHE_MAX_MB', 2048)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.refs_dir = os.path.join(self.root, 'refs')
+        self.staging_dir = os.path.join(self.root, 'staging')
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._entries = {}
+        self._pins = {}
+        self._locks = {}
+        self._loaded = False
+
+    def stats(self):
+        """
+        Returns the cache counters.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes_used": sum(entry["size"] for entry in self._entries.values())
+        }
+
+    @asynccontextmanager
+    async def open(self, shortcode, download):
+        """
+        Yields (video_path, thumbnail_path) for a shortcode, downloading it on a miss.
+        download is an async callable taking a target directory and returning
+        (video_path, thumbnail_path) like Instagram.download_reel. The entry can't be
+        evicted while the context is open.
+        """
+        paths = await self.acquire(shortcode, download)
+        try:
+            yield paths
+        finally:
+            if paths[0]:
+                self.release(shortcode)
+
+    async def acquire(self, shortcode, download=None):
+        """
+        Pins and returns (video_path, thumbnail_path) for a shortcode, downloading it on a miss.
+        Without a download callable a miss returns (None, None). Pair with release().
+        """
+        await self._load()
+        lock = self._locks.setdefault(shortcode, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(shortcode)
+            if entry is not None and not await asyncio.to_thread(self._entry_exists, entry):
+                self._forget(shortcode)
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                self.bytes_saved += entry["size"]
+                await asyncio.to_thread(self._touch, shortcode)
+            elif download is None:
+                return None, None
+            else:
+                self.misses += 1
+                entry = await self._download(shortcode, download)
+                if entry is None:
+                    return None, None
+            self._pins[shortcode] = self._pins.get(shortcode, 0) + 1
+            self._entries[shortcode] = self._entries.pop(shortcode, entry)
+        await self._evict()
+        return self._paths(entry)
+
+    def contains(self, shortcode):
+        """
+        Returns True if the shortcode is cached.
+        """
+        return shortcode in self._entries
+
+    def release(self, shortcode):
+        """
+        Unpins an entry returned by acquire().
+        """
+        pins = self._pins.get(shortcode, 0) - 1
+        if pins > 0:
+            self._pins[shortcode] = pins
+        else:
+            self._pins.pop(shortcode, None)
+
+    def discard(self, shortcode):
+        """
+        Removes an unpinned entry, e.g. one that is no longer needed.
+        """
+        if shortcode in self._entries and not self._pins.get(shortcode):
+            entry = self._forget(shortcode)
+            self._remove_entry_files(shortcode, entry, self._objects_in_use())
+
+    async def _download(self, shortcode, download):
+        staging = os.path.join(self.staging_dir, f'{shortcode}_{uuid.uuid4().hex}')
+        await asyncio.to_thread(os.makedirs, staging, exist_ok=True)
+        try:
+            video_path, thumbnail_path = await download(staging)
+            if not video_path:
+                return None
+            return await asyncio.to_thread(self._store, shortcode, video_path, thumbnail_path)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+
+    def _store(self, shortcode, video_path, thumbnail_path):
+        entry = {"shortcode": shortcode, "size": 0}
+        for kind, path in (("video", video_path), ("thumbnail", thumbnail_path)):
+            if not path:
+                continue
+            digest = self._hash_file(path)
+            name = digest + os.path.splitext(path)[1]
+            target = os.path.join(self.objects_dir, name)
+            if not os.path.exists(target):
+                # Same filesystem as staging, so the move is atomic
+                os.replace(path, target)
+            entry[kind] = name
+            entry["size"] += os.path.getsize(target)
+        self._write_ref(shortcode, entry)
+        return entry
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _write_ref(self, shortcode, entry):
+        ref_path = os.path.join(self.refs_dir, f'{shortcode}.json')
+        tmp_path = f'{ref_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, ref_path)
+
+    def _touch(self, shortcode):
+        try:
+            os.utime(os.path.join(self.refs_dir, f'{shortcode}.json'))
+        except OSError:
+            pass
+
+    def _entry_exists(self, entry):
+        return all(
+            os.path.exists(os.path.join(self.objects_dir, entry[kind]))
+            for kind in ("video", "thumbnail") if entry.get(kind)
+        )
+
+    def _paths(self, entry):
+        video_path = os.path.join(self.objects_dir, entry["video"]) if entry.get("video") else None
+        thumbnail_path = os.path.join(self.objects_dir, entry["thumbnail"]) if entry.get("thumbnail") else None
+        return video_path, thumbnail_path
+
+    def _forget(self, shortcode):
+        return self._entries.pop(shortcode, None)
+
+    async def _evict(self):
+        used = sum(entry["size"] for entry in self._entries.values())
+        # _entries is kept in least- to most-recently-used order
+        for shortcode in list(self._entries):
+            if used <= self.max_bytes:
+                break
+            if self._pins.get(shortcode):
+                continue
+            entry = self._forget(shortcode)
+            used -= entry["size"]
+            self.evictions += 1
+            await asyncio.to_thread(self._remove_entry_files, shortcode, entry, self._objects_in_use())
+
+    def _objects_in_use(self):
+        return {entry.get(kind) for entry in self._entries.values() for kind in ("video", "thumbnail")}
+
+    def _remove_entry_files(self, shortcode, entry, in_use):
+        try:
+            os.remove(os.path.join(self.refs_dir, f'{shortcode}.json'))
+        except OSError:
+            pass
+        for kind in ("video", "thumbnail"):
+            name = entry.get(kind)
+            if not name or name in in_use:
+                continue
+            path = os.path.join(self.objects_dir, name)
+            # instagrapi writes a generated thumbnail next to the video when none is given
+            for leftover in (path, f'{path}.jpg'):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+
+    async def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self._entries = await asyncio.to_thread(self._scan)
+        logging.info(f"Media cache at {self.root} holds {len(self._entries)} reels.")
+
+    def _scan(self):
+        for directory in (self.objects_dir, self.refs_dir, self.staging_dir):
+            os.makedirs(directory, exist_ok=True)
+        # Leftovers from downloads interrupted by a crash
+        for name in os.listdir(self.staging_dir):
+            shutil.rmtree(os.path.join(self.staging_dir, name), ignore_errors=True)
+        refs = []
+        for name in os.listdir(self.refs_dir):
+            path = os.path.join(self.refs_dir, name)
+            if not name.endswith('.json'):
+                os.remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                refs.append((os.path.getmtime(path), entry["shortcode"], entry))
+            except (OSError, ValueError, KeyError):
+                os.remove(path)
+        refs.sort(key=lambda ref: ref[0])
+        return {shortcode: entry for _, shortcode, entry in refs}
@@ -0,0 +1,221 @@
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from pymongo import monitoring
+
+# Upper bounds (seconds) of the histogram buckets; stages range from Mongo round trips to uploads
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        """
+        Monotonic counter with a fixed set of label names. Thread-safe.
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        Histogram of observed values (seconds) with a fixed set of label names. Thread-safe.
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def totals(self, by):
+        """
+        Returns {label value: (count, sum)} summed over every other label.
+        """
+        index = self.labels.index(by)
+        totals = {}
+        with self._lock:
+            for key, series in self._series.items():
+                count, total = totals.get(key[index], (0, 0.0))
+                totals[key[index]] = (count + series["count"], total + series["sum"])
+        return totals
+
+    def render(self):
+        with self._lock:
+            series = {key: {"buckets": list(s["buckets"]), "count": s["count"], "sum": s["sum"]}
+                      for key, s in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, s in sorted(series.items()):
+            for bound, count in zip(self.buckets, s["buckets"]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {s['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {s['sum']:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {s['count']}")
+        return lines
+
+STAGE_SECONDS = Histogram(
+    "insta_stage_seconds", "Duration of Instagram pipeline stages.", ["stage", "account", "proxy", "outcome"]
+)
+RETRIES = Counter("insta_retries_total", "Attempts retried by tenacity, by operation.", ["operation"])
+POST_RESULTS = Counter("insta_post_results_total", "Per-account posting results.", ["account", "result"])
+MONGO_SECONDS = Histogram(
+    "insta_mongo_command_seconds", "Duration of MongoDB commands.", ["command", "collection", "outcome"]
+)
+QUEUE_ITEMS = Counter("insta_queue_items_total", "Queue items claimed by the executor and how they ended.", ["outcome"])
+QUEUE_LAG_SECONDS = Histogram(
+    "insta_queue_claim_lag_seconds", "Delay between a queue item's scheduled time and its claim.",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600)
+)
+
+_metrics = [STAGE_SECONDS, RETRIES, POST_RESULTS, MONGO_SECONDS, QUEUE_ITEMS, QUEUE_LAG_SECONDS]
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def proxy_label(proxy):
+    """
+    Returns host:port of a proxy URL, without credentials, for use as a label.
+    """
+    if not proxy:
+        return "none"
+    parsed = urlparse(proxy if '://' in proxy else f'socks5://{proxy}')
+    return f"{parsed.hostname}:{parsed.port}" if parsed.port else str(parsed.hostname)
+
+@contextmanager
+def stage(name, account="", proxy=None):
+    """
+    Times the enclosed block as a pipeline stage; the outcome label is "error" if it raised.
+    """
+    start = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.monotonic() - start, stage=name, account=account,
+                              proxy=proxy_label(proxy), outcome=outcome)
+
+def timed(name, labels=None, none_is_failure=True):
+    """
+    Decorator timing every call of a sync or async function as the stage name. labels receives
+    the call's arguments and returns {"account": ..., "proxy": ...}. With none_is_failure, a call
+    that returns None (the Instagram methods' failure value) is recorded with outcome "empty".
+    """
+    def decorator(fn):
+        def record(start, outcome, args, kwargs):
+            extra = labels(*args, **kwargs) if labels else {}
+            STAGE_SECONDS.observe(time.monotonic() - start, stage=name, account=extra.get("account", ""),
+                                  proxy=proxy_label(extra.get("proxy")), outcome=outcome)
+
+        def outcome_of(result):
+            if none_is_failure and (result is None or result == (None, None)):
+                return "empty"
+            return "ok"
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.monotonic()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    record(start, "error", args, kwargs)
+                    raise
+                record(start, outcome_of(result), args, kwargs)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                record(start, "error", args, kwargs)
+                raise
+            record(start, outcome_of(result), args, kwargs)
+            return result
+        return wrapper
+    return decorator
+
+def count_retry(operation):
+    """
+    Returns a tenacity before_sleep hook counting each retry of operation.
+    """
+    return lambda retry_state: RETRIES.inc(operation=operation)
+
+def stage_totals():
+    """
+    Returns {stage: (count, total seconds)} across all accounts, for per-cycle summaries.
+    """
+    return STAGE_SECONDS.totals("stage")
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    pymongo command listener feeding MONGO_SECONDS, so every query made through database.py
+    is timed by command and collection.
+    """
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name,
+                              collection=collection, outcome=outcome)
@@ -0,0 +1,119 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+class Prefetcher:
+    def __init__(self, client_pool, media_cache, lookahead=None, depth=None, budget_bytes=None):
+        """
+        Downloads the next candidate reels for an account into the media cache shortly before
+        the account is due, so its posting slot can start uploading straight away.
+        Prefetched reels stay pinned in the cache until they are taken, dropped or replaced.
+        """
+        if lookahead is None:
+            lookahead = timedelta(minutes=float(os.getenv('PREFETCH_LOOKAHEAD_MINUTES', 30)))
+        if depth is None:
+            depth = int(os.getenv('PREFETCH_DEPTH', 2))
+        if budget_bytes is None:
+            budget_bytes = int(float(os.getenv('PREFETCH_BUDGET_MB', 200)) * 1024 * 1024)
+        self.client_pool = client_pool
+        self.media_cache = media_cache
+        self.lookahead = lookahead
+        self.depth = depth
+        self.budget_bytes = budget_bytes
+        self._candidates = {}
+        self._running = set()
+
+    async def run(self, db, accounts, due_times):
+        """
+        Prefetches for every account due within the lookahead window.
+        accounts are (username, password, source_accounts, proxy) tuples and due_times maps
+        a username to its next due time (timezone-aware UTC). Accounts without a due time,
+        e.g. ones being posted for right now, are skipped.
+        """
+        now = datetime.now(timezone.utc)
+        tasks = []
+        for account in accounts:
+            username = account[0]
+            due_time = due_times.get(username)
+            if username in self._running or due_time is None or due_time - now > self.lookahead:
+                continue
+            tasks.append(self.prefetch_account(db, account))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def prefetch_account(self, db, account):
+        """
+        Tops up one account's prefetched candidates, within its depth and disk budget.
+        """
+        username, password, _, proxy = account
+        self._running.add(username)
+        insta = None
+        try:
+            self._drop_invalid(db, username)
+            candidates = self._candidates.setdefault(username, [])
+            used = sum(candidate["size"] for candidate in candidates)
+            while len(candidates) < self.depth and used < self.budget_bytes:
+                if insta is None:
+                    insta = await self.client_pool.get(username, password, proxy)
+                    if insta is None:
+                        return
+                exclude = [candidate["doc"]["shortcode"] for candidate in candidates]
+                doc = db.get_random_available_not_posted(username, exclude=exclude)
+                if not doc:
+                    return
+                post, from_cache = await insta.get_post_from_cache(doc)
+                if not post:
+                    return
+                if not from_cache:
+                    db.refresh_available_reel(username, post)
+                download = lambda target_dir: insta.download_reel(post, target_dir)
+                video_path, thumbnail_path = await self.media_cache.acquire(post.shortcode, download)
+                if not video_path:
+                    return
+                size = sum(os.path.getsize(path) for path in (video_path, thumbnail_path) if path)
+                if used + size > self.budget_bytes:
+                    # Over this account's budget; leave the file to normal cache eviction
+                    self.media_cache.release(post.shortcode)
+                    return
+                candidates.append({"doc": doc, "size": size})
+                used += size
+                logging.info(f"Prefetched reel {post.shortcode} for {username}.")
+        except Exception as e:
+            logging.error(f"Prefetch failed for {username}: {e}")
+        finally:
+            if insta is not None:
+                self.client_pool.release(insta)
+            self._running.discard(username)
+
+    def take(self, db, username):
+        """
+        Returns the next still-valid prefetched available_reels doc for an account, or None.
+        """
+        self._drop_invalid(db, username)
+        candidates = self._candidates.get(username)
+        if not candidates:
+            return None
+        candidate = candidates.pop(0)
+        shortcode = candidate["doc"]["shortcode"]
+        self.media_cache.release(shortcode)
+        return candidate["doc"] if self.media_cache.contains(shortcode) else None
+
+    def _drop_invalid(self, db, username):
+        """
+        Drops candidates that were posted meanwhile (e.g. from the queue) or left the cache.
+        """
+        candidates = self._candidates.get(username)
+        if not candidates:
+            return
+        shortcodes = [candidate["doc"]["shortcode"] for candidate in candidates]
+        unposted = db.filter_unposted(username, shortcodes)
+        kept = []
+        for candidate in candidates:
+            shortcode = candidate["doc"]["shortcode"]
+            if shortcode in unposted and self.media_cache.contains(shortcode):
+                kept.append(candidate)
+            else:
+                self.media_cache.release(shortcode)
+                logging.info(f"Dropped prefetched reel {shortcode} for {username}.")
+        self._candidates[username] = kept
@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from leases import WORKER_ID
+import metrics
+
+# post_item results that mark an item failed without retrying
+PERMANENT_RESULTS = {"already_posted", "not_configured", "job_failed"}
+
+class QueueExecutor:
+    def __init__(self, db, post_item, worker_id=None, concurrency=None, poll_interval=None, lease=None,
+                 max_attempts=None, retry_delay=None):
+        """
+        Posts the operator-scheduled items of the queue collection.
+        Due pending items are claimed atomically (pending -> in_progress with a lease), so several
+        executors can share a queue; a crashed executor's items are reclaimed once their lease expires.
+        post_item is an async callable taking the queue item and returning a process_account result.
+        """
+        self.db = db
+        self.post_item = post_item
+        self.worker_id = worker_id or WORKER_ID
+        self.concurrency = concurrency or int(os.getenv('QUEUE_CONCURRENCY', 2))
+        self.poll_interval = poll_interval or float(os.getenv('QUEUE_POLL_SECONDS', 60))
+        self.lease = lease or timedelta(minutes=float(os.getenv('QUEUE_LEASE_MINUTES', 10)))
+        self.max_attempts = max_attempts or int(os.getenv('QUEUE_MAX_ATTEMPTS', 3))
+        self.retry_delay = retry_delay or timedelta(minutes=float(os.getenv('QUEUE_RETRY_MINUTES', 10)))
+        self.claimed = 0
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self._lag_total = 0.0
+        self._started = time.monotonic()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._wake = asyncio.Event()
+        self._loop = None
+        self._tasks = set()
+
+    def wake(self):
+        """
+        Makes the executor poll now. Safe to call from any thread.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def on_change(self, kind, payload):
+        """
+        Database listener: wakes the executor when an item is (re)queued.
+        """
+        if kind == "queue" and payload.get("status") == "pending":
+            self.wake()
+
+    def stats(self):
+        """
+        Returns throughput and lag metrics for the executor. The same counts are exported
+        to Prometheus as insta_queue_items_total and insta_queue_claim_lag_seconds.
+        """
+        hours = max(time.monotonic() - self._started, 1) / 3600
+        return {
+            "claimed": self.claimed,
+            "done": self.done,
+            "failed": self.failed,
+            "retried": self.retried,
+            "in_progress": len(self._tasks),
+            "done_per_hour": round(self.done / hours, 2),
+            "lag_seconds_last": round(self.lag_last, 1),
+            "lag_seconds_avg": round(self._lag_total / self.claimed, 1) if self.claimed else 0.0,
+            "lag_seconds_max": round(self.lag_max, 1)
+        }
+
+    async def run(self):
+        """
+        Claims and posts due items until cancelled, sleeping until the next scheduled item,
+        a wake-up, or the poll interval.
+        """
+        self._loop = asyncio.get_running_loop()
+        self.db.add_listener(self.on_change)
+        try:
+            while True:
+                self._wake.clear()
+                while True:
+                    await self._slots.acquire()
+                    try:
+                        item = await asyncio.to_thread(self.db.claim_queue_item, self.worker_id, self.lease)
+                    except Exception as e:
+                        logging.error(f"Error claiming queue item: {e}")
+                        item = None
+                    if item is None:
+                        self._slots.release()
+                        break
+                    task = asyncio.create_task(self._execute(item))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                await self._sleep()
+        finally:
+            if self.on_change in self.db.listeners:
+                self.db.listeners.remove(self.on_change)
+            for task in list(self._tasks):
+                task.cancel()
+
+    async def _sleep(self):
+        timeout = self.poll_interval
+        try:
+            next_time = await asyncio.to_thread(self.db.next_queue_time)
+            if isinstance(next_time, datetime):
+                timeout = min(timeout, max((next_time - datetime.utcnow()).total_seconds(), 0))
+        except Exception as e:
+            logging.error(f"Error reading next queue time: {e}")
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _execute(self, item):
+        heartbeat = None
+        try:
+            self.claimed += 1
+            metrics.QUEUE_ITEMS.inc(outcome="claimed")
+            scheduled_time = item.get("scheduled_time")
+            if isinstance(scheduled_time, datetime):
+                self.lag_last = max((item["claimed_at"] - scheduled_time).total_seconds(), 0)
+                self.lag_max = max(self.lag_max, self.lag_last)
+                self._lag_total += self.lag_last
+                metrics.QUEUE_LAG_SECONDS.observe(self.lag_last)
+            logging.info(f"Posting queued reel {item['shortcode']} for {item['account_username']} "
+                         f"(attempt {item.get('attempts', 1)}).")
+            heartbeat = asyncio.create_task(self._heartbeat(item))
+            max_attempts = self.max_attempts
+            try:
+                result = await self.post_item(item)
+                error = None if result == "posted" else result
+                if result in PERMANENT_RESULTS:
+                    # Retrying can't help, fail the item right away
+                    max_attempts = 0
+            except Exception as e:
+                error = str(e)
+            heartbeat.cancel()
+            status = await asyncio.to_thread(
+                self.db.finish_queue_item, item, self.worker_id, error, max_attempts, self.retry_delay
+            )
+            if status == "done":
+                self.done += 1
+            elif status == "failed":
+                self.failed += 1
+            elif status == "pending":
+                self.retried += 1
+            metrics.QUEUE_ITEMS.inc(outcome={"pending": "retried"}.get(status, status or "lost"))
+            if status is None:
+                logging.warning(f"Lost the claim on queued reel {item['shortcode']} for {item['account_username']}.")
+            if error:
+                self.db.log_activity("ERROR", f"Queued reel {item['shortcode']} failed ({error}), now {status}.",
+                                     item["account_username"], "queue_failure")
+        except Exception as e:
+            logging.error(f"Error executing queued reel {item.get('shortcode')}: {e}")
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            self._slots.release()
+
+    async def _heartbeat(self, item):
+        # Keep the lease alive while a slow upload is running
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            if not await asyncio.to_thread(self.db.renew_queue_lease, item["_id"], self.worker_id, self.lease):
+                logging.warning(f"Queue lease on {item['shortcode']} was taken over.")
+                return
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from metrics import proxy_label
+
+# Default (requests per minute, burst) per endpoint class, overridable with
+# RATE_LIMIT_<CLASS>_PER_MINUTE and RATE_LIMIT_<CLASS>_BURST
+ENDPOINT_LIMITS = {
+    "scrape": (30, 10),     # anonymous instaloader queries for source profiles and posts
+    "download": (60, 10),   # media downloads from the CDN
+    "read": (20, 5),        # authenticated lookups: session checks, media_info
+    "upload": (4, 1),       # reel uploads
+    "login": (2, 1)         # password logins
+}
+
+# Phrases in error messages that mean Instagram is throttling us. A bare "429" isn't one:
+# shortcodes and ids contain it too, so only an actual HTTP status of 429 counts.
+THROTTLE_MARKERS = ("please wait", "too many requests", "rate limit", "throttled")
+
+def looks_throttled(error):
+    """
+    Returns True if an exception carries an HTTP 429 response or its message reads like a
+    rate-limit response.
+    """
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429 or getattr(error, 'code', None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+class TokenBucket:
+    def __init__(self, rate, capacity, min_factor=1 / 16, recovery_interval=60.0, penalty=30.0):
+        """
+        Token bucket refilled at rate tokens per second, holding up to capacity tokens.
+        Thread-safe. Callers reserve a token and sleep for the returned delay, so waiters
+        queue up in order. On a throttle the rate is halved (down to min_factor of its base)
+        and the bucket pauses for penalty seconds, doubling with repeated throttles; every
+        recovery_interval without a throttle the rate doubles back towards its base.
+        """
+        self.base_rate = rate
+        self.capacity = capacity
+        self.min_factor = min_factor
+        self.recovery_interval = recovery_interval
+        self.penalty = penalty
+        self.factor = 1.0
+        self.throttles = 0
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_change = self._updated
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.base_rate * self.factor
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.factor < 1.0 and now - self._last_change >= self.recovery_interval:
+                self.factor = min(self.factor * 2, 1.0)
+                self._last_change = now
+                if self.factor == 1.0:
+                    self._strikes = 0
+            self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.capacity)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(delay, self._paused_until - now)
+
+    def throttle(self):
+        """
+        Backs off after Instagram signalled a rate limit.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            self._strikes += 1
+            self.factor = max(self.factor / 2, self.min_factor)
+            self._last_change = now
+            self._tokens = min(self._tokens, 0.0)
+            self._paused_until = max(self._paused_until, now + self.penalty * 2 ** min(self._strikes - 1, 5))
+
+class RateLimiter:
+    def __init__(self, account_rate=None, account_burst=None):
+        """
+        Shared pacing for every Instagram call: one token bucket per (proxy, endpoint class)
+        and one per account. A call waits for a token from each bucket it maps to.
+        Anonymous calls that don't go through a proxy share the None proxy key.
+        """
+        if account_rate is None:
+            account_rate = float(os.getenv('RATE_LIMIT_ACCOUNT_PER_MINUTE', 30))
+        if account_burst is None:
+            account_burst = int(os.getenv('RATE_LIMIT_ACCOUNT_BURST', 5))
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.recovery_interval = float(os.getenv('RATE_LIMIT_RECOVERY_SECONDS', 120))
+        self.penalty = float(os.getenv('RATE_LIMIT_PENALTY_SECONDS', 30))
+        self.waited = 0.0
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if key[0] == "account":
+                    per_minute, burst = self.account_rate, self.account_burst
+                else:
+                    endpoint = key[2]
+                    per_minute, burst = ENDPOINT_LIMITS[endpoint]
+                    per_minute = float(os.getenv(f'RATE_LIMIT_{endpoint.upper()}_PER_MINUTE', per_minute))
+                    burst = int(os.getenv(f'RATE_LIMIT_{endpoint.upper()}_BURST', burst))
+                bucket = self._buckets[key] = TokenBucket(
+                    per_minute / 60, max(burst, 1),
+                    recovery_interval=self.recovery_interval, penalty=self.penalty
+                )
+            return bucket
+
+    def _buckets_for(self, proxy, endpoint, account):
+        buckets = [self._bucket(("proxy", proxy, endpoint))]
+        if account:
+            buckets.append(self._bucket(("account", account)))
+        return buckets
+
+    def _reserve(self, proxy, endpoint, account):
+        delay = max(bucket.reserve() for bucket in self._buckets_for(proxy, endpoint, account))
+        with self._lock:
+            self.waited += delay
+        return delay
+
+    def wait(self, proxy, endpoint, account=None):
+        """
+        Blocking: waits until a call to endpoint through proxy (and for account) may go out.
+        """
+        delay = self._reserve(proxy, endpoint, account)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, proxy, endpoint, account=None):
+        """
+        Awaitable version of wait().
+        """
+        delay = self._reserve(proxy, endpoint, account)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def throttled(self, proxy, endpoint, account=None):
+        """
+        Reports a rate-limit response, slowing down the buckets the call went through.
+        """
+        logging.warning(f"Rate limited on {endpoint} (proxy {proxy_label(proxy)}, account {account or 'none'}); backing off.")
+        for bucket in self._buckets_for(proxy, endpoint, account):
+            bucket.throttle()
+
+    def stats(self):
+        """
+        Returns the current rate and throttle count of every bucket, plus the total time spent waiting.
+        Proxies are named by host:port, as the keys are logged and proxy URLs carry credentials.
+        """
+        with self._lock:
+            buckets = dict(self._buckets)
+            waited = self.waited
+        return {
+            "waited_seconds": round(waited, 1),
+            "buckets": {
+                self._stats_key(key): {
+                    "per_minute": round(bucket.rate * 60, 2),
+                    "throttles": bucket.throttles
+                }
+                for key, bucket in buckets.items()
+            }
+        }
+
+    @staticmethod
+    def _stats_key(key):
+        if key[0] == "proxy":
+            key = (key[0], proxy_label(key[1])) + key[2:]
+        return ":".join(str(part) for part in key)
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """
+    Returns the process-wide rate limiter, creating it on first use.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,78 @@
+import heapq
+import asyncio
+import itertools
+from datetime import datetime, timezone
+
+class DeadlineScheduler:
+    def __init__(self):
+        """
+        In-memory priority queue of per-account due times.
+        Each key has at most one live deadline; rescheduling leaves the old heap entry
+        behind, and such stale entries are skipped when they reach the top.
+        """
+        self._heap = []
+        self._due = {}
+        self._counter = itertools.count()
+        self._wake = asyncio.Event()
+
+    def schedule(self, key, due_time):
+        """
+        Sets (or moves) the deadline for a key and wakes the waiter so it can re-plan.
+        """
+        self._due[key] = due_time
+        heapq.heappush(self._heap, (due_time, next(self._counter), key))
+        self._wake.set()
+
+    def remove(self, key):
+        """
+        Forgets a key's deadline.
+        """
+        self._due.pop(key, None)
+
+    def due_times(self):
+        """
+        Returns a copy of the pending deadlines by key.
+        """
+        return dict(self._due)
+
+    def next_deadline(self):
+        """
+        Returns the earliest pending deadline, or None.
+        """
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """
+        Removes and returns every key whose deadline is at or before now.
+        """
+        now = now or datetime.now(timezone.utc)
+        keys = []
+        while self._heap and self._heap[0][0] <= now:
+            due_time, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due_time:
+                del self._due[key]
+                keys.append(key)
+        return keys
+
+    def wake(self):
+        """
+        Makes a pending wait() return early, e.g. after a config change.
+        """
+        self._wake.set()
+
+    async def wait(self, max_wait):
+        """
+        Sleeps until the next deadline, a wake-up, or max_wait seconds, whichever comes first.
+        """
+        deadline = self.next_deadline()
+        timeout = max_wait
+        if deadline is not None:
+            timeout = min(max_wait, max((deadline - datetime.now(timezone.utc)).total_seconds(), 0))
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._wake.clear()
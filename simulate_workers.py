@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import multiprocessing
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from database import get_database
+from leases import AccountLease
+
+# Local check of account leases: several worker processes share one fleet of fake accounts
+# in a scratch database and "post" whenever an account is due. Usage:
+#   python simulate_workers.py [workers] [accounts] [seconds]
+# Set SIMULATION_DATABASE_NAME to choose the scratch database (default: lease_simulation).
+
+INTERVAL = timedelta(seconds=5)
+
+async def simulate_worker(worker_id, accounts, seconds):
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('SIMULATION_DATABASE_NAME', 'lease_simulation'))
+    stop_at = time.monotonic() + seconds
+    while time.monotonic() < stop_at:
+        now = datetime.now(timezone.utc)
+        statuses = await asyncio.to_thread(db.get_account_statuses, accounts)
+        for username in random.sample(accounts, len(accounts)):
+            status = statuses.get(username) or {}
+            last_post_time = status.get("last_post_time")
+            if last_post_time is not None and last_post_time + INTERVAL > now:
+                continue
+            lease = AccountLease(db, username, holder=worker_id, ttl=timedelta(seconds=30))
+            if not await lease.acquire(last_post_time):
+                continue
+            posted_at = None
+            try:
+                # Stand-in for process_account: a slow upload, recorded like a real post
+                await asyncio.sleep(random.uniform(0.05, 0.3))
+                posted_at = datetime.now(timezone.utc)
+                db.db.simulated_posts.insert_one({
+                    "account_username": username,
+                    "worker_id": worker_id,
+                    "slot": last_post_time,
+                    "posted_at": posted_at
+                })
+            finally:
+                await lease.release(posted_at)
+        await asyncio.sleep(random.uniform(0.1, 0.5))
+
+def run_worker(worker_id, accounts, seconds):
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(simulate_worker(worker_id, accounts, seconds))
+
+def main():
+    load_dotenv()
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    account_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    db = get_database(os.getenv('MONGO_CONNECTION_STRING'), os.getenv('SIMULATION_DATABASE_NAME', 'lease_simulation'))
+    accounts = [f"sim_account_{i}" for i in range(account_count)]
+    db.db.account_status.delete_many({"account_username": {"$in": accounts}})
+    db.db.simulated_posts.delete_many({})
+
+    # Spawn rather than fork, so no worker inherits this process's Mongo client
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(f"sim-worker-{i}", accounts, seconds))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    posts = list(db.db.simulated_posts.find({}, {"_id": 0}))
+    by_worker = Counter(post["worker_id"] for post in posts)
+    # Two posts for the same account based on the same previous post are a double post
+    slots = Counter((post["account_username"], post["slot"]) for post in posts)
+    duplicates = {slot: count for slot, count in slots.items() if count > 1}
+    # Posts closer together than the interval also mean two workers posted for one slot
+    too_close = 0
+    for username in accounts:
+        times = sorted(post["posted_at"] for post in posts if post["account_username"] == username)
+        too_close += sum(1 for a, b in zip(times, times[1:]) if b - a < INTERVAL)
+
+    print(f"{len(posts)} posts for {account_count} accounts by {workers} workers in {seconds:.0f}s")
+    for worker_id, count in sorted(by_worker.items()):
+        print(f"  {worker_id}: {count} posts ({count / max(len(posts), 1):.0%})")
+    print(f"Duplicate posts: {sum(count - 1 for count in duplicates.values())}, posts inside the interval: {too_close}")
+    return 1 if duplicates or too_close else 0
+
+if __name__ == "__main__":
+    sys.exit(main())